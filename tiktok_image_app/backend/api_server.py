@@ -3,14 +3,20 @@ Flask API server for TikTok Image Generator
 Handles image generation requests from Flutter app
 """
 
-from flask import Flask, request, jsonify, redirect, session, send_from_directory
+from flask import Flask, Response, request, jsonify, redirect, session, send_file
 from flask_cors import CORS
+from werkzeug.security import safe_join
 import sys
 import os
-import random
 import time
 import secrets
 import json
+import threading
+import base64
+import math
+import mimetypes
+from stat import S_ISREG
+from dataclasses import replace
 
 # Import TikTok API modules
 # Initialize as None first, then try to import
@@ -61,7 +67,18 @@ if not photo_editor_path:
     raise ImportError("Could not find tiktok_image_generator.py. Please check the path.")
 
 try:
-    from tiktok_image_generator import TikTokImageGenerator
+    from tiktok_image_generator import TikTokImageGenerator, derive_seed, new_seed
+    from render_spec import CANVAS_PRESETS, DEFAULT_SIZE, RenderSpec, canvas_unit
+    from batch_renderer import BatchRenderer, run_job
+    from generation_jobs import JobStore
+    from single_flight import SingleFlight
+    from output_store import ETagIndex, is_content_addressed
+    from output_retention import OutputRetention
+    from gradients import GRADIENT_MODES, GradientSpec
+    from text_effects import parse_effects
+    from decorations import parse_decorations
+    from encoders import parse_encoding
+    from text_layout import TextBox
     print("✓ Successfully imported TikTokImageGenerator")
 except ImportError as e:
     print(f"✗ Error importing tiktok_image_generator: {e}")
@@ -76,9 +93,74 @@ CORS(app, supports_credentials=True)  # Enable CORS with credentials for OAuth
 # Use absolute path for output directory to avoid issues on Render.com
 output_dir = os.path.join(os.path.dirname(__file__), "output")
 os.makedirs(output_dir, exist_ok=True)
-generator = TikTokImageGenerator(output_dir=output_dir)
+generator = TikTokImageGenerator(output_dir=output_dir, preload_atlas=True)
 print(f"✓ Image generator initialized with output_dir: {output_dir}")
 
+# Worker processes per gunicorn worker for batch rendering (1 = render in-process)
+RENDER_JOBS = max(1, int(os.environ.get('RENDER_JOBS', '1')))
+_batch_renderer = None
+_batch_renderer_lock = threading.Lock()
+
+# Background generation jobs (see /api/jobs). Records live outside the
+# output directory, so /api/images can't serve them.
+JOB_WORKERS = max(1, int(os.environ.get('JOB_WORKERS', '2')))
+JOB_TTL = float(os.environ.get('JOB_TTL', '3600'))
+# Unfinished jobs of a process on another host fail after this many
+# seconds without progress (jobs of a dead local process fail at once)
+JOB_STALE_AFTER = float(os.environ.get('JOB_STALE_AFTER', '1800'))
+# Batches with more texts than this are rendered as jobs even without
+# "async" (0 = only when asked)
+ASYNC_MIN_TEXTS = int(os.environ.get('ASYNC_MIN_TEXTS', '0'))
+job_store = JobStore(os.path.join(os.path.dirname(__file__), "jobs"), JOB_WORKERS, JOB_TTL,
+                     JOB_STALE_AFTER)
+
+# Encoding of generated images unless a request sets "output_format": a preset
+# (png, png-fast, png-small, webp, webp-lossless, jpeg)
+OUTPUT_ENCODING = parse_encoding(os.environ.get('OUTPUT_FORMAT', 'png'))
+
+# Raster scale of "preview": true renders (same composition, fewer pixels)
+PREVIEW_SCALE = float(os.environ.get('PREVIEW_SCALE', '0.25'))
+
+# Bounds of a requested canvas side ("size" / "targets"), in pixels
+MIN_CANVAS_SIDE = 64
+MAX_CANVAS_SIDE = int(os.environ.get('MAX_CANVAS_SIDE', '3840'))
+
+# Identical concurrent /api/generate requests share one render; a finished
+# batch is reused for COALESCE_TTL seconds (double taps, client retries)
+COALESCE_TTL = float(os.environ.get('COALESCE_TTL', '10'))
+render_flights = SingleFlight(ttl=COALESCE_TTL)
+
+# Hashes of served files, for ETag / If-None-Match
+output_etags = ETagIndex()
+
+# How /api/images sends file bytes:
+#   "" (default)       the worker streams the file via wsgi.file_wrapper, which
+#                      gunicorn sends with zero-copy sendfile()
+#   "x-accel-redirect" nginx sends it: the response names IMAGE_ACCEL_PREFIX +
+#                      filename, an internal location aliased to the output dir
+#   "x-sendfile"       Apache mod_xsendfile / lighttpd send the absolute path
+# With a proxy sending the bytes, the worker is free once the headers are out.
+IMAGE_OFFLOAD = os.environ.get('IMAGE_OFFLOAD', '').lower()
+IMAGE_ACCEL_PREFIX = '/' + os.environ.get('IMAGE_ACCEL_PREFIX', '/_output/').strip('/') + '/'
+if IMAGE_OFFLOAD not in ('', 'x-accel-redirect', 'x-sendfile'):
+    print(f"⚠️  Warning: Unknown IMAGE_OFFLOAD '{IMAGE_OFFLOAD}', serving images directly")
+    IMAGE_OFFLOAD = ''
+
+# Retention of generated images: files unused for OUTPUT_MAX_AGE seconds are
+# deleted, and the least recently used go once the directory exceeds
+# OUTPUT_MAX_MB. A background thread sweeps every OUTPUT_SWEEP_INTERVAL seconds.
+output_retention = OutputRetention(
+    output_dir,
+    max_bytes=int(float(os.environ.get('OUTPUT_MAX_MB', '512')) * 1024 * 1024),
+    max_age=float(os.environ.get('OUTPUT_MAX_AGE', str(24 * 3600))),
+    interval=float(os.environ.get('OUTPUT_SWEEP_INTERVAL', '300')),
+)
+
+@app.before_request
+def _start_output_retention():
+    # Started lazily so each (forked) server process runs its own sweeper
+    output_retention.start()
+
 # Initialize TikTok API (if available)
 tiktok_api = None
 try:
@@ -153,192 +235,698 @@ def _extract_semantic_colors_from_text(text):
     print(f"    No semantic keywords found in text")
     return None
 
+def _parse_seed(value):
+    """Return the request's seed as an int, drawing a new one if absent/invalid."""
+    if value is not None and not isinstance(value, bool):
+        try:
+            return int(value)
+        except (ValueError, TypeError):
+            print(f"⚠️  Warning: Invalid seed {value!r}, using a random one")
+    return new_seed()
+
+def _parse_decoration_seed(value):
+    """Return the request's decoration_seed as an int, or None if absent/invalid."""
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        return int(value)
+    except (ValueError, TypeError):
+        print(f"⚠️  Warning: Invalid decoration_seed {value!r}, ignoring")
+        return None
+
+def _parse_scale(data):
+    """Raster scale of a request: "scale" if given, PREVIEW_SCALE for "preview"."""
+    value = data.get('scale')
+    if value is None:
+        return PREVIEW_SCALE if data.get('preview') else 1.0
+    try:
+        return max(0.05, min(1.0, float(value)))
+    except (ValueError, TypeError):
+        print(f"⚠️  Warning: Invalid scale {value!r}, rendering at full size")
+        return 1.0
+
+def _parse_size(value):
+    """(width, height) of a canvas: a preset name ("9:16", "4:5", "1:1",
+    "16:9"), "WIDTHxHEIGHT", {"width", "height"} or [width, height].
+    
+    Returns None (with a warning) if the value is invalid.
+    """
+    try:
+        if isinstance(value, str):
+            if value in CANVAS_PRESETS:
+                return CANVAS_PRESETS[value]
+            width, height = value.lower().split('x')
+        elif isinstance(value, dict):
+            width, height = value['width'], value['height']
+        else:
+            width, height = value
+        width, height = int(width), int(height)
+    except (ValueError, TypeError, KeyError):
+        print(f"⚠️  Warning: Invalid canvas size {value!r}, ignoring")
+        return None
+    return (max(MIN_CANVAS_SIDE, min(MAX_CANVAS_SIDE, width)),
+            max(MIN_CANVAS_SIDE, min(MAX_CANVAS_SIDE, height)))
+
+def _parse_canvas(data):
+    """Canvas sizes of a request as (size, targets).
+    
+    "size" is the main canvas and "targets" lists further sizes rendered
+    from the same composition; without "size", the first target is the
+    main canvas. Defaults to the 1080x1920 TikTok canvas.
+    """
+    values = data.get('targets') or []
+    if not isinstance(values, list):
+        values = [values]
+    if data.get('size') is not None:
+        values = [data['size']] + values
+    sizes = []
+    for value in values:
+        size = _parse_size(value)
+        if size is not None and size not in sizes:
+            sizes.append(size)
+    if not sizes:
+        return DEFAULT_SIZE, ()
+    return sizes[0], tuple(sizes[1:])
+
+def _parse_fonts(value):
+    """Return the request's preferred fonts (file names or paths) as a tuple."""
+    if not value:
+        return ()
+    if isinstance(value, str):
+        value = [value]
+    return tuple(font for font in value if isinstance(font, str))
+
+def _parse_text_box(data, size=DEFAULT_SIZE, targets=()):
+    """Return a TextBox when auto_fit is requested, else None.
+    
+    Optional text_box fields (margin_x, margin_y, min_size, max_size)
+    override the defaults. Margins are kept within half the canvas the
+    text is laid out on, measured in standard pixels like TextBox values.
+    """
+    if not data.get('auto_fit'):
+        return None
+    box = data.get('text_box') or {}
+    defaults = TextBox()
+    canvas = generator.layout_canvas(RenderSpec(size=size, targets=targets))
+    unit = canvas_unit(canvas)
+    width, height = int(canvas[0] / unit), int(canvas[1] / unit)
+    try:
+        margin_x = max(0, min(width // 2 - 1, int(box.get('margin_x', defaults.margin_x))))
+        margin_y = max(0, min(height // 2 - 1, int(box.get('margin_y', defaults.margin_y))))
+        min_size = max(8, int(box.get('min_size', defaults.min_size)))
+        max_size = max(min_size, min(400, int(box.get('max_size', defaults.max_size))))
+    except (ValueError, TypeError, AttributeError) as e:
+        print(f"⚠️  Warning: Invalid text_box {box}: {e}, using defaults")
+        return defaults
+    return TextBox(margin_x=margin_x, margin_y=margin_y, min_size=min_size, max_size=max_size)
+
+def _text_fit_report(texts, spec):
+    """Chosen font size and line count per text (None without auto_fit).
+    
+    Fits each text on the canvas the render lays it out on, which with
+    render targets is smaller than spec.size.
+    """
+    if spec.text_box is None:
+        return None
+    canvas = generator.layout_canvas(spec)
+    report = []
+    for text in texts:
+        font_size, lines = generator.fit_text(text, spec.text_box, spec.fonts, canvas)
+        report.append({'font_size': font_size, 'line_count': sum(1 for line, _ in lines if line)})
+    return report
+
+def _parse_point(value, default=(0.5, 0.5)):
+    """Convert {"x": .., "y": ..} or [x, y] into a relative (x, y) tuple."""
+    try:
+        if isinstance(value, dict):
+            return (float(value.get('x', default[0])), float(value.get('y', default[1])))
+        if isinstance(value, (list, tuple)) and len(value) >= 2:
+            return (float(value[0]), float(value[1]))
+    except (ValueError, TypeError):
+        pass
+    return default
+
+def _parse_gradient_spec(data):
+    """Build a GradientSpec from the request's gradient_* fields.
+    
+    gradient_direction may be any of GRADIENT_MODES or a number (shorthand
+    for 'angle' mode). Unknown values fall back to 'vertical'.
+    """
+    direction = data.get('gradient_direction', 'vertical')
+    angle = data.get('gradient_angle', 0)
+    if isinstance(direction, (int, float)) and not isinstance(direction, bool):
+        direction, angle = 'angle', direction
+    if direction not in GRADIENT_MODES:
+        direction = 'vertical'
+    
+    try:
+        angle = float(angle)
+    except (ValueError, TypeError):
+        angle = 0.0
+    
+    radius = data.get('gradient_radius')
+    try:
+        radius = float(radius) if radius is not None else None
+    except (ValueError, TypeError):
+        radius = None
+    if radius is not None and not (math.isfinite(radius) and radius > 0):
+        print(f"⚠️  Warning: Invalid gradient_radius {radius}, using the farthest corner")
+        radius = None
+    
+    stops = data.get('gradient_stops')
+    try:
+        stops = tuple(float(s) for s in stops) if stops else None
+    except (ValueError, TypeError):
+        stops = None
+    
+    centers = data.get('gradient_centers') or []
+    return GradientSpec(
+        mode=direction,
+        angle=angle,
+        center=_parse_point(data.get('gradient_center')),
+        centers=tuple(_parse_point(c) for c in centers if c is not None),
+        radius=radius,
+        stops=stops,
+    )
+
+def _iter_render_jobs(jobs):
+    """Render a batch, yielding each BatchResult as soon as it is saved.
+    
+    Renders on the process pool when RENDER_JOBS > 1. The pool is started
+    on first use, i.e. inside the serving process rather than in a
+    preloading gunicorn master, and replaces its processes itself if one
+    of them dies.
+    """
+    global _batch_renderer
+    if RENDER_JOBS == 1 or len(jobs) < 2:
+        results = (run_job(generator, i, job) for i, job in enumerate(jobs))
+    else:
+        with _batch_renderer_lock:
+            if _batch_renderer is None:
+                _batch_renderer = BatchRenderer(generator.output_dir, RENDER_JOBS)
+        results = _batch_renderer.iter_render(jobs)
+    for result in results:
+        if result.reused:
+            # Handing out a stored image again counts as a use
+            for path in (result.path,) + result.target_paths:
+                output_retention.touch(path)
+        yield result
+
+def _render_jobs(jobs):
+    """Render a batch; one BatchResult per job, in input order."""
+    return sorted(_iter_render_jobs(jobs), key=lambda result: result.index)
+
+def _target_urls(result, spec, base_url):
+    """{"WIDTHxHEIGHT": url} of a persisted result's extra render targets."""
+    return {f"{w}x{h}": f"{base_url}/api/images/{os.path.basename(path)}"
+            for (w, h), path in zip(spec.targets, result.target_paths)}
+
+def _target_data(result, spec):
+    """{"WIDTHxHEIGHT": base64 image} of an in-memory result's extra render targets."""
+    return {f"{w}x{h}": base64.b64encode(data).decode('ascii')
+            for (w, h), data in zip(spec.targets, result.target_data)}
+
+def _batch_response(results, seed, texts, spec):
+    """JSON response for a rendered batch; failed images are listed separately.
+    
+    With render targets, "targets" holds the URLs of each image's other
+    sizes, in the order of image_paths.
+    """
+    image_urls = []
+    target_urls = []
+    images = []
+    failed = []
+    # Return HTTP URLs instead of file paths
+    base_url = request.url_root.rstrip('/')
+    for result in results:
+        if result.ok and result.path:
+            # Extract just the filename and create an HTTP URL
+            filename = os.path.basename(result.path)
+            image_urls.append(f"{base_url}/api/images/{filename}")
+            target_urls.append(_target_urls(result, spec, base_url))
+        elif result.ok:
+            # Not persisted: the encoded image travels in the response
+            image = {
+                'index': result.index,
+                'mimetype': spec.encoding.mimetype,
+                'data': base64.b64encode(result.data).decode('ascii'),
+            }
+            if spec.targets:
+                image['targets'] = _target_data(result, spec)
+            images.append(image)
+        else:
+            failed.append({'index': result.index, 'error': result.error})
+    
+    if not image_urls and not images:
+        return jsonify({'error': failed[0]['error'] if failed else 'No images rendered',
+                        'failed': failed}), 500
+    
+    body = {
+        'success': True,
+        'image_paths': image_urls,  # Now returns URLs
+        'count': len(image_urls) + len(images),
+        'seed': seed,
+        'seeds': [derive_seed(seed, i) for i in range(len(results))],
+        'failed': failed,
+        'text_fit': _text_fit_report(texts, spec)
+    }
+    if spec.targets:
+        body['size'] = f"{spec.size[0]}x{spec.size[1]}"
+        body['targets'] = target_urls
+    if images:
+        body['images'] = images
+    return jsonify(body)
+
+def _prepare_batch(data):
+    """Parse a generate request into render jobs, one per text.
+    
+    Files are named by a hash of their render inputs, so identical renders
+    share one file (and are skipped) and batches never overwrite each other.
+    With "persist": false no file is written; the encoded images are
+    returned instead.
+    
+    Returns:
+        (texts, seed, spec, jobs), or None if the request has no texts
+    """
+    texts = data.get('texts', [])
+    gradient_colors = data.get('gradient_colors', [])
+    gradient_direction = data.get('gradient_direction', 'vertical')
+    use_content_based_image = data.get('use_content_based_image', False)
+    seed = _parse_seed(data.get('seed'))
+    size, targets = _parse_canvas(data)
+    # Everything a render depends on, passed explicitly to the shared
+    # generator (which keeps no per-request state)
+    spec = RenderSpec(
+        size=size,
+        targets=targets,
+        seed=seed,
+        fonts=_parse_fonts(data.get('fonts')),
+        effects=parse_effects(data.get('text_effects')),
+        text_box=_parse_text_box(data, size, targets),
+        decorations=parse_decorations(data.get('decorations')),
+        decoration_seed=_parse_decoration_seed(data.get('decoration_seed')),
+        encoding=parse_encoding(data.get('output_format'), OUTPUT_ENCODING),
+        scale=_parse_scale(data),
+    )
+    
+    print(f"\n📥 Received request:")
+    print(f"  Texts: {len(texts)} items")
+    print(f"  Gradient colors: {len(gradient_colors) if gradient_colors else 0} colors")
+    print(f"  Gradient direction: {gradient_direction}")
+    print(f"  Content-based image: {use_content_based_image}")
+    print(f"  Seed: {seed}")
+    print(f"  Output format: {spec.encoding.format}")
+    print(f"  Canvas: {' + '.join(f'{w}x{h}' for w, h in (spec.size,) + spec.targets)}")
+    if spec.scale != 1.0:
+        print(f"  Preview scale: {spec.scale}")
+    
+    if use_content_based_image:
+        print("  ⚠️  CONTENT-BASED MODE: Will IGNORE selected gradient colors")
+        print("  ⚠️  Will extract colors from text content instead")
+    
+    if not texts:
+        return None
+    
+    # If content-based image is requested, generate image based on text content
+    if use_content_based_image:
+        print("🎨 Content-based image generation requested")
+        print("   Generating background image from text content...")
+    
+        # Generate images with content-based backgrounds
+        jobs = []
+    
+        # Convert gradient direction first
+        direction = _parse_gradient_spec(data)
+    
+        for i, text in enumerate(texts):
+            print(f"  📝 Processing text {i+1}: {text[:50]}...")
+    
+            # TODO: INTEGRATE AI IMAGE GENERATION API HERE
+            # Currently, we use semantic color extraction as a placeholder
+            # To generate actual images, you need to:
+            # 1. Sign up for an AI image API (DALL-E, Stable Diffusion, etc.)
+            # 2. Add API key to environment variables
+            # 3. Implement generate_ai_image_from_text() function
+            # 4. Replace the gradient creation below with:
+            #    background_img = generate_ai_image_from_text(text)
+            #    img = Image.open(background_img).resize((1080, 1920))
+    
+            # For now: Extract semantic colors from text (creates gradient, not image)
+            semantic_colors = _extract_semantic_colors_from_text(text)
+    
+            # In content-based mode, ALWAYS use semantic colors from text
+            # Ignore manually selected gradient colors
+            if semantic_colors and len(semantic_colors) > 0:
+                bg_colors = semantic_colors
+                print(f"  🎨 Text {i+1}: Using semantic colors: {semantic_colors}")
+                print(f"  ⚠️  NOTE: This creates a GRADIENT, not an AI-generated image")
+                print(f"  ⚠️  To get actual images, integrate an AI image generation API")
+            else:
+                # If no semantic match, use random (not user-selected colors):
+                # the render picks a standard palette with its seed
+                bg_colors = None
+                print(f"  🎨 Text {i+1}: No semantic match, using random colors")
+                print(f"  ⚠️  NOTE: This is still a GRADIENT, not an AI-generated image")
+    
+            # Create gradient background with semantic colors
+            # TODO: Replace with: img = load_ai_generated_image(text)
+            image_spec = replace(spec, palette=tuple(bg_colors) if bg_colors else None,
+                                 direction=direction, seed=derive_seed(seed, i))
+            jobs.append(generator.content_job(text, image_spec))
+    
+        return texts, seed, spec, _persist_jobs(data, jobs)
+    
+    # Convert gradient direction
+    direction = _parse_gradient_spec(data)
+    
+    # Convert gradient colors to RGB tuples (optional)
+    color_tuples = []
+    if gradient_colors and len(gradient_colors) > 0:
+        for color in gradient_colors:
+            r = color.get('r', 255) if isinstance(color, dict) else 255
+            g = color.get('g', 255) if isinstance(color, dict) else 255
+            b = color.get('b', 255) if isinstance(color, dict) else 255
+            color_tuples.append((r, g, b))
+        print(f"  ✓ Custom gradient colors provided: {len(color_tuples)} colors")
+        print(f"  Colors: {color_tuples}")
+    else:
+        print(f"  ✓ No custom colors - using random gradient")
+    
+    # If custom colors provided, use them; otherwise use random gradients
+    if color_tuples and len(color_tuples) > 0:
+        print(f"✓ Using custom gradient: {len(color_tuples)} colors, direction: {direction}")
+        print(f"  Colors: {color_tuples}")
+        # The custom palette travels in the spec; the shared generator
+        # is never modified
+        custom_spec = replace(spec, palette=tuple(color_tuples), direction=direction)
+    
+        # Generate images with custom gradient and direction
+        # Background + decorations are built once per batch (per worker)
+        # when decoration_seed is fixed; only the text is drawn per image
+        jobs = [
+            generator.content_job(text, replace(custom_spec, seed=derive_seed(seed, i)))
+            for i, text in enumerate(texts)
+        ]
+    else:
+        print("✓ Using random gradients (no custom colors provided)")
+        # Use random gradients (default behavior)
+        jobs = [
+            generator.content_job(text, replace(spec, seed=derive_seed(seed, i)))
+            for i, text in enumerate(texts)
+        ]
+    
+    return texts, seed, spec, _persist_jobs(data, jobs)
+
+def _persist_jobs(data, jobs):
+    """Drop the output files of jobs when the request asks for "persist": false."""
+    if data.get('persist', True):
+        return jobs
+    return [replace(job, name=None, reuse=False) for job in jobs]
+
+def _request_fingerprint(data, jobs):
+    """Key identifying a generate request by what it renders.
+    
+    Built from the parsed jobs, so requests differing only in key order,
+    color notation or other spellings of the same spec match. The seed is
+    the requested one (None if absent), not the one drawn for this request.
+    """
+    seed = data.get('seed')
+    try:
+        seed = None if seed is None or isinstance(seed, bool) else int(seed)
+    except (ValueError, TypeError):
+        seed = None
+    return seed, tuple((job.text, replace(job.spec, seed=None), job.name is None) for job in jobs)
+
+def _submit_generation_job(texts, seed, spec, jobs):
+    """Queue a batch on the job store and answer 202 with its status URL."""
+    if any(job.name is None for job in jobs):
+        return jsonify({'error': 'Background jobs need persisted images'}), 400
+    record = job_store.submit(len(jobs), lambda: _iter_render_jobs(jobs), {
+        'seed': seed,
+        'seeds': [derive_seed(seed, i) for i in range(len(jobs))],
+        'text_fit': _text_fit_report(texts, spec),
+    })
+    print(f"  ✓ Queued job {record['id']} ({len(jobs)} images)")
+    status_url = f"{request.url_root.rstrip('/')}/api/jobs/{record['id']}"
+    return jsonify({
+        'success': True,
+        'job_id': record['id'],
+        'status': record['status'],
+        'status_url': status_url,
+        'count': record['count'],
+        'seed': seed,
+        'seeds': record['seeds'],
+    }), 202, {'Location': status_url}
+
 @app.route('/api/generate', methods=['POST'])
 def generate_images():
-    """Generate images from texts and gradient colors."""
+    """Generate images from texts and gradient colors.
+    
+    Renders synchronously, or as a background job when "async" is true
+    (see /api/jobs).
+    """
     try:
         data = request.json
-        texts = data.get('texts', [])
-        gradient_colors = data.get('gradient_colors', [])
-        gradient_direction = data.get('gradient_direction', 'vertical')
-        use_content_based_image = data.get('use_content_based_image', False)
-        
-        print(f"\n📥 Received request:")
-        print(f"  Texts: {len(texts)} items")
-        print(f"  Gradient colors: {len(gradient_colors) if gradient_colors else 0} colors")
-        print(f"  Gradient direction: {gradient_direction}")
-        print(f"  Content-based image: {use_content_based_image}")
-        
-        if use_content_based_image:
-            print("  ⚠️  CONTENT-BASED MODE: Will IGNORE selected gradient colors")
-            print("  ⚠️  Will extract colors from text content instead")
-        
-        if not texts:
+        batch = _prepare_batch(data)
+        if batch is None:
             return jsonify({'error': 'No texts provided'}), 400
-        
-        # If content-based image is requested, generate image based on text content
-        if use_content_based_image:
-            print("🎨 Content-based image generation requested")
-            print("   Generating background image from text content...")
-            
-            # Generate images with content-based backgrounds
-            image_paths = []
-            import time
-            timestamp = int(time.time() * 1000)
-            
-            # Convert gradient direction first
-            direction_map = {
-                'vertical': 'vertical',
-                'horizontal': 'horizontal',
-                'diagonal': 'diagonal'
-            }
-            direction = direction_map.get(gradient_direction, 'vertical')
-            
-            for i, text in enumerate(texts):
-                print(f"  📝 Processing text {i+1}: {text[:50]}...")
-                
-                # TODO: INTEGRATE AI IMAGE GENERATION API HERE
-                # Currently, we use semantic color extraction as a placeholder
-                # To generate actual images, you need to:
-                # 1. Sign up for an AI image API (DALL-E, Stable Diffusion, etc.)
-                # 2. Add API key to environment variables
-                # 3. Implement generate_ai_image_from_text() function
-                # 4. Replace the gradient creation below with:
-                #    background_img = generate_ai_image_from_text(text)
-                #    img = Image.open(background_img).resize((1080, 1920))
-                
-                # For now: Extract semantic colors from text (creates gradient, not image)
-                semantic_colors = _extract_semantic_colors_from_text(text)
-                
-                # In content-based mode, ALWAYS use semantic colors from text
-                # Ignore manually selected gradient colors
-                if semantic_colors and len(semantic_colors) > 0:
-                    bg_colors = semantic_colors
-                    print(f"  🎨 Text {i+1}: Using semantic colors: {semantic_colors}")
-                    print(f"  ⚠️  NOTE: This creates a GRADIENT, not an AI-generated image")
-                    print(f"  ⚠️  To get actual images, integrate an AI image generation API")
-                else:
-                    # If no semantic match, use random (not user-selected colors)
-                    palette = random.choice(generator.color_palettes)
-                    bg_colors = palette
-                    print(f"  🎨 Text {i+1}: No semantic match, using random colors")
-                    print(f"  ⚠️  NOTE: This is still a GRADIENT, not an AI-generated image")
-                
-                # Create gradient background with semantic colors
-                # TODO: Replace with: img = load_ai_generated_image(text)
-                img = generator.create_gradient_background(bg_colors, direction)
-                
-                img = generator.add_decorative_elements(img)
-                img = generator.add_text_to_image(img, text)
-                
-                filename = f"tiktok_image_{timestamp}_{i:03d}.png"
-                filepath = os.path.join(generator.output_dir, filename)
-                img.save(filepath, "PNG", quality=95)
-                image_paths.append(filepath)
-                print(f"  ✓ Generated content-based image {i+1}/{len(texts)}: {filename}")
-            
-            # Return HTTP URLs instead of file paths
-            base_url = request.url_root.rstrip('/')
-            image_urls = []
-            for path in image_paths:
-                filename = os.path.basename(path)
-                image_url = f"{base_url}/api/images/{filename}"
-                image_urls.append(image_url)
-            
-            return jsonify({
-                'success': True,
-                'image_paths': image_urls,  # Now returns URLs
-                'count': len(image_urls)
-            })
-        
-        # Convert gradient direction
-        direction_map = {
-            'vertical': 'vertical',
-            'horizontal': 'horizontal',
-            'diagonal': 'diagonal'
-        }
-        direction = direction_map.get(gradient_direction, 'vertical')
-        
-        # Convert gradient colors to RGB tuples (optional)
-        color_tuples = []
-        if gradient_colors and len(gradient_colors) > 0:
-            for color in gradient_colors:
-                r = color.get('r', 255) if isinstance(color, dict) else 255
-                g = color.get('g', 255) if isinstance(color, dict) else 255
-                b = color.get('b', 255) if isinstance(color, dict) else 255
-                color_tuples.append((r, g, b))
-            print(f"  ✓ Custom gradient colors provided: {len(color_tuples)} colors")
-            print(f"  Colors: {color_tuples}")
+        texts, seed, spec, jobs = batch
+        
+        run_async = data.get('async')
+        if run_async is None:
+            run_async = 0 < ASYNC_MIN_TEXTS < len(jobs)
+        if run_async:
+            return _submit_generation_job(texts, seed, spec, jobs)
+        
+        (results, seed, texts, spec), shared = render_flights.do(
+            _request_fingerprint(data, jobs),
+            lambda: (_render_jobs(jobs), seed, texts, spec),
+            # In-memory images are shared while in flight, but not kept
+            reusable=lambda batch: any(r.ok and r.path for r in batch[0]),
+        )
+        if shared:
+            print("  ✓ Identical request already rendered, sharing its images")
         else:
-            print(f"  ✓ No custom colors - using random gradient")
-        
-        # If custom colors provided, use them; otherwise use random gradients
-        if color_tuples and len(color_tuples) > 0:
-            print(f"✓ Using custom gradient: {len(color_tuples)} colors, direction: {direction}")
-            print(f"  Colors: {color_tuples}")
-            # Temporarily set custom palette
-            original_palettes = generator.color_palettes
-            generator.color_palettes = [color_tuples]
-            try:
-                # Generate images with custom gradient and direction
-                image_paths = []
-                import time
-                timestamp = int(time.time() * 1000)  # Use timestamp for unique filenames
-                for i, text in enumerate(texts):
-                    # Create gradient background with specified direction
-                    img = generator.create_gradient_background(color_tuples, direction)
-                    img = generator.add_decorative_elements(img)
-                    img = generator.add_text_to_image(img, text)
-                    
-                    # Save image with unique filename (timestamp + index)
-                    filename = f"tiktok_image_{timestamp}_{i:03d}.png"
-                    filepath = os.path.join(generator.output_dir, filename)
-                    img.save(filepath, "PNG", quality=95)
-                    image_paths.append(filepath)
-                    print(f"  ✓ Generated image {i+1}/{len(texts)}: {filename} with colors {color_tuples}")
-            finally:
-                # Restore original palettes
-                generator.color_palettes = original_palettes
+            print(f"  ✓ Generated {sum(r.ok for r in results)}/{len(texts)} images")
+        return _batch_response(results, seed, texts, spec)
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def _stream_events(results, seed, jobs, base_url, sse):
+    """Encode a batch's progress as SSE or NDJSON events.
+    
+    Yields a "start" event, one "image" event per result in completion
+    order, then a "done" event with the totals.
+    """
+    def event(name, payload):
+        if sse:
+            return f"event: {name}\ndata: {json.dumps(payload)}\n\n"
+        return json.dumps({'event': name, **payload}) + "\n"
+    
+    start = time.perf_counter()
+    yield event('start', {
+        'count': len(jobs),
+        'seed': seed,
+        'seeds': [derive_seed(seed, i) for i in range(len(jobs))],
+    })
+    completed = failed = 0
+    for result in results:
+        payload = {
+            'index': result.index,
+            'render_seconds': round(result.seconds, 4),
+            'encode_seconds': round(result.encode_seconds, 4),
+            'elapsed_seconds': round(time.perf_counter() - start, 4),
+        }
+        spec = jobs[result.index].spec
+        if result.ok and result.path:
+            completed += 1
+            payload['url'] = f"{base_url}/api/images/{os.path.basename(result.path)}"
+            if spec.targets:
+                payload['targets'] = _target_urls(result, spec, base_url)
+        elif result.ok:
+            completed += 1
+            payload['mimetype'] = spec.encoding.mimetype
+            payload['data'] = base64.b64encode(result.data).decode('ascii')
+            if spec.targets:
+                payload['targets'] = _target_data(result, spec)
         else:
-            print("✓ Using random gradients (no custom colors provided)")
-            # Use random gradients (default behavior)
-            image_paths = generator.generate_batch(texts)
-        
-        # Return HTTP URLs instead of file paths
-        # Get base URL from request
-        base_url = request.url_root.rstrip('/')
-        image_urls = []
-        for path in image_paths:
-            # Extract just the filename
-            filename = os.path.basename(path)
-            # Create HTTP URL
-            image_url = f"{base_url}/api/images/{filename}"
-            image_urls.append(image_url)
-        
-        return jsonify({
-            'success': True,
-            'image_paths': image_urls,  # Now returns URLs
-            'count': len(image_urls)
-        })
+            failed += 1
+            payload['error'] = result.error
+        yield event('image', payload)
+    yield event('done', {
+        'completed': completed,
+        'failed': failed,
+        'elapsed_seconds': round(time.perf_counter() - start, 4),
+    })
+
+@app.route('/api/generate/stream', methods=['POST'])
+def generate_images_stream():
+    """Generate images, streaming an event as each one is saved.
+    
+    Takes the same body as /api/generate. Answers Server-Sent Events when
+    the client accepts text/event-stream, NDJSON otherwise.
+    """
+    try:
+        batch = _prepare_batch(request.json)
+        if batch is None:
+            return jsonify({'error': 'No texts provided'}), 400
+        texts, seed, spec, jobs = batch
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    
+    sse = request.accept_mimetypes.best_match(
+        ['application/x-ndjson', 'text/event-stream']) == 'text/event-stream'
+    # Rendering starts when the first chunk is pulled, after the headers
+    # are sent; the generator doesn't touch the request context
+    events = _stream_events(_iter_render_jobs(jobs), seed, jobs,
+                            request.url_root.rstrip('/'), sse)
+    return Response(events, mimetype='text/event-stream' if sse else 'application/x-ndjson',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/render', methods=['POST'])
+def render_image():
+    """Render one text and answer with the encoded image itself.
+    
+    Takes the /api/generate body with a single "text" (or the first of
+    "texts"). Nothing is written to disk unless "persist" is true.
+    """
+    try:
+        data = dict(request.json or {})
+        if data.get('text') is not None:
+            data['texts'] = [data['text']]
+        data['texts'] = (data.get('texts') or [])[:1]
+        data.setdefault('persist', False)
+        batch = _prepare_batch(data)
+        if batch is None:
+            return jsonify({'error': 'No text provided'}), 400
+        texts, seed, spec, jobs = batch
+        
+        result = next(_iter_render_jobs(jobs))
+        if not result.ok:
+            return jsonify({'error': result.error}), 500
+        job = jobs[0]
+        headers = {
+            'X-Render-Seed': str(job.spec.seed),
+            'X-Render-Seconds': f"{result.seconds:.4f}",
+            'X-Encode-Seconds': f"{result.encode_seconds:.4f}",
+        }
+        if result.path:
+            # Persisted: the body is still the image, plus where it lives
+            headers['Content-Location'] = f"/api/images/{os.path.basename(result.path)}"
+            with open(result.path, 'rb') as f:
+                return Response(f.read(), mimetype=job.spec.encoding.mimetype, headers=headers)
+        return Response(result.data, mimetype=job.spec.encoding.mimetype, headers=headers)
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/jobs', methods=['POST'])
+def create_generation_job():
+    """Start a background generation job; takes the same body as /api/generate."""
+    try:
+        batch = _prepare_batch(request.json)
+        if batch is None:
+            return jsonify({'error': 'No texts provided'}), 400
+        return _submit_generation_job(*batch)
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def generation_job_status(job_id):
+    """Report a job's progress, with the URL of every finished image."""
+    record = job_store.get(job_id)
+    if record is None:
+        return jsonify({'error': 'Job not found or expired'}), 404
+    
+    # Which process runs the job is internal
+    record.pop('host', None)
+    record.pop('pid', None)
+    base_url = request.url_root.rstrip('/')
+    for image in record['images']:
+        filename = image.pop('filename', None)
+        if filename:
+            image['url'] = f"{base_url}/api/images/{filename}"
+        targets = image.pop('target_filenames', None)
+        if targets:
+            image['targets'] = {size: f"{base_url}/api/images/{name}"
+                                for size, name in targets.items()}
+    record['image_paths'] = [image['url'] for image in record['images'] if 'url' in image]
+    record['success'] = record['status'] != 'failed'
+    return jsonify(record)
+
 @app.route('/api/health', methods=['GET'])
 def health():
     """Health check endpoint."""
-    return jsonify({'status': 'ok', 'tiktok_available': TIKTOK_AVAILABLE})
+    return jsonify({
+        'status': 'ok',
+        'tiktok_available': TIKTOK_AVAILABLE,
+        'background_cache': generator.backgrounds.stats(),
+        'line_cache': generator.line_cache.stats(),
+        'decoration_cache': generator.decoration_cache.stats(),
+        'layer_cache': generator.layer_cache.stats(),
+        'coalescing': render_flights.stats(),
+        'output': output_retention.stats(),
+    })
+
+def _offloaded_image(path, filename, stat, etag, max_age):
+    """Headers-only image response whose bytes the front proxy sends.
+    
+    Conditional requests are answered here (a 304 never reaches the
+    proxy's file handler); Range requests are left to the proxy.
+    """
+    response = Response(mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream')
+    response.set_etag(etag)
+    response.last_modified = stat.st_mtime
+    if max_age is not None:
+        response.cache_control.max_age = max_age
+    else:
+        response.cache_control.no_cache = True
+    response = response.make_conditional(request)
+    if response.status_code == 200:
+        if IMAGE_OFFLOAD == 'x-accel-redirect':
+            response.headers['X-Accel-Redirect'] = IMAGE_ACCEL_PREFIX + filename
+        else:
+            response.headers['X-Sendfile'] = os.path.abspath(path)
+    return response
 
-@app.route('/api/images/<path:filename>', methods=['GET'])
+@app.route('/api/images/<path:filename>', methods=['GET', 'HEAD'])
 def serve_image(filename):
-    """Serve generated images via HTTP."""
+    """Serve generated images via HTTP.
+    
+    Supports HEAD, Range (206) and conditional requests: If-None-Match
+    against the strong ETag and If-Modified-Since against Last-Modified
+    answer 304. The bytes are sent by the front proxy when IMAGE_OFFLOAD
+    is set, otherwise with sendfile() where the server supports it.
+    """
     try:
-        # Get the output directory
-        output_dir = generator.output_dir
         # Security: Only serve files from output directory
-        if not os.path.exists(os.path.join(output_dir, filename)):
+        output_dir = generator.output_dir
+        path = safe_join(output_dir, filename)
+        # One stat both checks the file and feeds the validators; a file
+        # evicted in between is simply a 404
+        try:
+            stat = os.stat(path) if path else None
+        except OSError:
+            stat = None
+        if stat is None or not S_ISREG(stat.st_mode):
             return jsonify({'error': 'Image not found'}), 404
-        return send_from_directory(output_dir, filename)
+        output_retention.touch(path)
+        etag = output_etags.etag(path)
+        # The name of a content-addressed file is a hash of its render
+        # inputs, so the file never changes and can be cached for good
+        immutable = is_content_addressed(filename)
+        max_age = 31536000 if immutable else None
+        if IMAGE_OFFLOAD:
+            response = _offloaded_image(path, filename, stat, etag, max_age)
+        else:
+            response = send_file(path, etag=etag, max_age=max_age, last_modified=stat.st_mtime)
+        if immutable:
+            response.cache_control.public = True
+            response.cache_control.immutable = True
+        return response
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -585,7 +1173,7 @@ def tiktok_post_video():
         privacy_level = data.get('privacy_level', 'PUBLIC_TO_EVERYONE')
         video_duration = data.get('duration', 5)  # Default 5 seconds
         
-        if not image_path:
+        if not image_path and not data.get('text'):
             return jsonify({'error': 'No image path provided'}), 400
         
         if user_id not in tiktok_tokens:
@@ -608,8 +1196,14 @@ def tiktok_post_video():
                 'error': 'Video conversion not available. Please install moviepy: pip install moviepy'
             }), 503
         
+        if not image_path:
+            # Render the text (with the /api/generate options) straight
+            # into the video, without an intermediate image file
+            texts, seed, spec, jobs = _prepare_batch({**data, 'texts': [data['text']]})
+            image_path = generator.render(jobs[0].text, jobs[0].spec)
+        
         # Convert image to video
-        print(f"📹 Converting image to video: {image_path}")
+        print(f"📹 Converting image to video: {image_path if isinstance(image_path, str) else 'rendered text'}")
         video_path = image_to_video(image_path, duration=video_duration)
         
         # Get video file size
@@ -0,0 +1,136 @@
+"""
+Background atlas for TikTok Image Generator
+Pre-renders the standard palettes into a memory-mapped file shared by all workers
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple, Union
+
+import numpy as np
+
+from gradients import LEGACY_DIRECTIONS, GradientSpec, sanitize_colors, render_gradient
+
+# Bump when the gradient engine output changes so stale atlases are rebuilt
+ATLAS_VERSION = 1
+
+
+class BackgroundAtlas:
+    """Read-only gradient backgrounds shared across processes.
+
+    The standard palettes x legacy directions are rendered once into a
+    ``.npy`` file and opened with ``mmap_mode='r'``. Every worker that maps
+    the same file (or inherits the mapping via fork) shares the same
+    physical pages, and lookups return zero-copy views into it.
+
+    Backgrounds outside the atlas (custom palettes, other gradient modes,
+    other sizes) are kept in a bounded LRU next to it.
+    """
+
+    def __init__(self, palettes: List[List[Tuple[int, int, int]]], width: int, height: int,
+                 cache_dir: str, lru_size: int = 8):
+        """Initialize the atlas.
+
+        Args:
+            palettes: Standard color palettes to pre-render
+            width: Background width in pixels
+            height: Background height in pixels
+            cache_dir: Directory holding the atlas file
+            lru_size: Max number of custom backgrounds kept in memory
+        """
+        self.palettes = [tuple(sanitize_colors(p)) for p in palettes]
+        self.width = width
+        self.height = height
+        self.cache_dir = cache_dir
+        self.lru_size = lru_size
+        self.hits = 0
+        self.misses = 0
+
+        self._index = {}
+        for p, palette in enumerate(self.palettes):
+            for d, direction in enumerate(LEGACY_DIRECTIONS):
+                self._index[(palette, GradientSpec(mode=direction))] = p * len(LEGACY_DIRECTIONS) + d
+        self._atlas: Optional[np.ndarray] = None
+        self._lru: "OrderedDict[tuple, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def path(self) -> str:
+        """Atlas file path, keyed by palettes, size and engine version."""
+        key = repr((ATLAS_VERSION, self.palettes, LEGACY_DIRECTIONS, self.width, self.height))
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+        return os.path.join(self.cache_dir, f"atlas_{self.width}x{self.height}_{digest}.npy")
+
+    def load(self) -> None:
+        """Map the atlas file, building it first if it does not exist yet.
+
+        The file is written to a temporary name and renamed into place, so
+        concurrently starting workers never map a partially written atlas.
+        """
+        path = self.path
+        if not os.path.exists(path):
+            os.makedirs(self.cache_dir, exist_ok=True)
+            print(f"Building background atlas ({len(self._index)} backgrounds)...")
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            shape = (len(self._index), self.height, self.width, 3)
+            atlas = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.uint8, shape=shape)
+            for (palette, spec), slot in self._index.items():
+                atlas[slot] = render_gradient(list(palette), self.width, self.height, spec)
+            atlas.flush()
+            del atlas
+            os.replace(tmp_path, path)
+
+        self._atlas = np.load(path, mmap_mode='r')
+        print(f"✓ Background atlas mapped: {path}")
+
+    def get(self, colors: List[Tuple[int, int, int]],
+            direction: Union[str, GradientSpec] = "vertical",
+            size: Optional[Tuple[int, int]] = None) -> np.ndarray:
+        """Return a read-only background array for the palette and direction.
+
+        Args:
+            colors: RGB color tuples (sanitized here)
+            direction: Gradient direction name or GradientSpec
+            size: (width, height); the atlas size if None
+
+        Returns:
+            uint8 array of shape (height, width, 3); do not modify it
+        """
+        colors = sanitize_colors(colors)
+        spec = direction if isinstance(direction, GradientSpec) else GradientSpec(mode=direction)
+        width, height = size or (self.width, self.height)
+        key = (tuple(colors), spec)
+
+        slot = self._index.get(key) if (width, height) == (self.width, self.height) else None
+        if slot is not None and self._atlas is not None:
+            self.hits += 1
+            return self._atlas[slot]
+
+        key += (width, height)
+        with self._lock:
+            cached = self._lru.get(key)
+            if cached is not None:
+                self._lru.move_to_end(key)
+                self.hits += 1
+                return cached
+
+        self.misses += 1
+        pixels = render_gradient(colors, width, height, spec)
+        pixels.setflags(write=False)
+        with self._lock:
+            self._lru[key] = pixels
+            while len(self._lru) > self.lru_size:
+                self._lru.popitem(last=False)
+        return pixels
+
+    def stats(self) -> dict:
+        """Cache counters for monitoring."""
+        return {
+            'atlas_loaded': self._atlas is not None,
+            'atlas_entries': len(self._index),
+            'lru_entries': len(self._lru),
+            'hits': self.hits,
+            'misses': self.misses,
+        }
@@ -0,0 +1,219 @@
+"""
+Batch rendering for TikTok Image Generator
+Renders independent images on a pool of pre-initialized worker processes
+"""
+
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+from output_store import target_name
+from render_spec import RenderSpec
+
+
+@dataclass(frozen=True)
+class RenderJob:
+    """One image of a batch.
+
+    Attributes:
+        text: Text content to display
+        spec: Render inputs (with the image's own seed)
+        name: Output file name without extension; None returns the encoded
+            bytes instead of writing a file. Extra render targets of the
+            spec are saved as name_<width>x<height>
+        reuse: Skip the render if the named file already exists (for
+            content-addressed names, where it holds this exact image)
+    """
+    text: str
+    spec: RenderSpec
+    name: Optional[str] = None
+    reuse: bool = False
+
+
+@dataclass(frozen=True)
+class BatchResult:
+    """Outcome of one RenderJob; exactly one of path/data/error is set.
+
+    path and data hold the image at spec.size; target_paths and
+    target_data the images at spec.targets, in order.
+    """
+    index: int
+    path: Optional[str] = None
+    data: Optional[bytes] = None
+    error: Optional[str] = None
+    target_paths: Tuple[str, ...] = ()
+    target_data: Tuple[bytes, ...] = ()
+    seconds: float = 0.0
+    # Part of seconds spent encoding (and writing) the image
+    encode_seconds: float = 0.0
+    # The file was already in the output directory and wasn't rendered again
+    reused: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def _output_names(job: RenderJob) -> List[str]:
+    """File names of a named job: spec.size first, then each target."""
+    return [job.name] + [target_name(job.name, size) for size in job.spec.targets]
+
+
+def run_job(generator, index: int, job: RenderJob) -> BatchResult:
+    """Render, then save or encode one job, capturing any error.
+
+    Args:
+        generator: TikTokImageGenerator to render with
+        index: Position of the job in its batch
+        job: Job to run
+
+    Returns:
+        BatchResult for the job
+    """
+    start = time.perf_counter()
+    try:
+        if job.reuse and job.name is not None:
+            paths = [generator.output_path(name, job.spec) for name in _output_names(job)]
+            if all(os.path.exists(path) for path in paths):
+                return BatchResult(index, path=paths[0], target_paths=tuple(paths[1:]),
+                                   reused=True, seconds=time.perf_counter() - start)
+        if job.spec.targets:
+            images = generator.render_targets(job.text, job.spec)
+        else:
+            images = [generator.render(job.text, job.spec)]
+        encode_start = time.perf_counter()
+        if job.name is None:
+            data = [job.spec.encoding.encode(img) for img in images]
+            return BatchResult(index, data=data[0], target_data=tuple(data[1:]),
+                               seconds=time.perf_counter() - start,
+                               encode_seconds=time.perf_counter() - encode_start)
+        paths = [generator.save_image(img, name, job.spec)
+                 for img, name in zip(images, _output_names(job))]
+        return BatchResult(index, path=paths[0], target_paths=tuple(paths[1:]),
+                           seconds=time.perf_counter() - start,
+                           encode_seconds=time.perf_counter() - encode_start)
+    except Exception as e:
+        print(f"⚠️  Warning: Could not render image {index + 1}: {e}")
+        return BatchResult(index, error=f"{type(e).__name__}: {e}",
+                           seconds=time.perf_counter() - start)
+
+
+# Generator of the current worker process (set by _init_worker)
+_worker_generator = None
+
+
+def _init_worker(output_dir: str) -> None:
+    global _worker_generator
+    # Imported here: the generator module imports this one
+    from tiktok_image_generator import TikTokImageGenerator
+    # Fonts are indexed once per worker; the background atlas is mapped
+    # from the shared file, so its pages are not duplicated
+    _worker_generator = TikTokImageGenerator(output_dir=output_dir, preload_atlas=True)
+
+
+def _run_worker_job(index: int, job: RenderJob) -> BatchResult:
+    return run_job(_worker_generator, index, job)
+
+
+class BatchRenderer:
+    """Pool of worker processes, each holding its own initialized generator.
+
+    Keep one renderer alive across batches: workers start once and then
+    keep their font, layout and background caches warm. If a worker dies
+    (e.g. killed for memory), the jobs it took down fail and the pool is
+    replaced, so later batches render normally.
+    """
+
+    def __init__(self, output_dir: str, workers: Optional[int] = None):
+        """Start the pool.
+
+        Args:
+            output_dir: Directory workers save images to
+            workers: Number of processes (CPU count if None)
+        """
+        self.output_dir = output_dir
+        self.workers = workers or os.cpu_count() or 1
+        self.restarts = 0
+        self._lock = threading.Lock()
+        self._executor = self._start()
+
+    def _start(self) -> ProcessPoolExecutor:
+        # Workers are started from a fork server (or spawned), never forked
+        # from the caller: a server process is multi-threaded by the time
+        # the pool starts, and forking it can deadlock. Workers build their
+        # own generator, so they need nothing from the parent's memory.
+        method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        return ProcessPoolExecutor(
+            max_workers=self.workers, initializer=_init_worker, initargs=(self.output_dir,),
+            mp_context=multiprocessing.get_context(method),
+        )
+
+    def _restart(self, broken: ProcessPoolExecutor) -> ProcessPoolExecutor:
+        """Replace a broken executor (once, however many callers saw it break)."""
+        with self._lock:
+            if self._executor is broken:
+                print("⚠️  Warning: Render worker died, restarting the pool")
+                broken.shutdown(wait=False, cancel_futures=True)
+                self._executor = self._start()
+                self.restarts += 1
+            return self._executor
+
+    def _submit(self, index: int, job: RenderJob):
+        """(future, executor) of a job queued on the current executor."""
+        executor = self._executor
+        try:
+            return executor.submit(_run_worker_job, index, job), executor
+        except BrokenProcessPool:
+            # Broken since an earlier batch; nothing of this job ran yet
+            executor = self._restart(executor)
+            return executor.submit(_run_worker_job, index, job), executor
+
+    def render(self, jobs: Sequence[RenderJob]) -> List[BatchResult]:
+        """Render jobs in parallel.
+
+        Returns:
+            One BatchResult per job, in input order; a failing job (even a
+            crashed worker) only fails its own result and the jobs running
+            alongside it
+        """
+        return sorted(self.iter_render(jobs), key=lambda result: result.index)
+
+    def iter_render(self, jobs: Sequence[RenderJob]) -> Iterator[BatchResult]:
+        """Render jobs in parallel, yielding each result as it completes."""
+        futures = {}
+        for i, job in enumerate(jobs):
+            try:
+                future, executor = self._submit(i, job)
+                futures[future] = (i, executor)
+            except Exception as e:
+                print(f"⚠️  Warning: Could not queue image {i + 1}: {e}")
+                yield BatchResult(i, error=f"{type(e).__name__}: {e}")
+        broken = set()
+        for future in as_completed(futures):
+            index, executor = futures[future]
+            try:
+                yield future.result()
+            except BrokenProcessPool as e:
+                broken.add(executor)
+                print(f"⚠️  Warning: Worker died on image {index + 1}: {e}")
+                yield BatchResult(index, error=f"{type(e).__name__}: {e}")
+            except Exception as e:
+                print(f"⚠️  Warning: Worker failed on image {index + 1}: {e}")
+                yield BatchResult(index, error=f"{type(e).__name__}: {e}")
+        for executor in broken:
+            self._restart(executor)
+
+    def close(self) -> None:
+        with self._lock:
+            self._executor.shutdown()
+
+    def __enter__(self) -> "BatchRenderer":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,203 @@
+"""
+Decorations for TikTok Image Generator
+Draws every decorative shape into one RGBA overlay, reproducible from a seed
+"""
+
+import math
+import random
+from typing import List, Optional, Sequence, Tuple
+
+from PIL import Image, ImageDraw
+
+from render_spec import scaled_size
+
+DECORATION_SHAPES = ("circles", "lines", "rings", "blobs", "dots")
+
+# The shapes drawn before decorations became configurable
+DEFAULT_SHAPES: Tuple[str, ...] = ("circles", "lines")
+
+# Vertices of a blob outline
+BLOB_POINTS = 48
+
+
+def _clip_box(box, width: int, height: int) -> Optional[Tuple[int, int, int, int]]:
+    """Integer (x0, y0, x1, y1) of box inside the canvas, or None if outside."""
+    x0 = max(0, int(math.floor(box[0])))
+    y0 = max(0, int(math.floor(box[1])))
+    x1 = min(width, int(math.ceil(box[2])) + 1)
+    y1 = min(height, int(math.ceil(box[3])) + 1)
+    if x1 <= x0 or y1 <= y0:
+        return None
+    return x0, y0, x1, y1
+
+
+def _composite(overlay: Image.Image, color: Tuple[int, int, int], alpha: int,
+               box, draw_mask) -> None:
+    """Draw one shape into a tile covering its box and composite it.
+
+    Args:
+        overlay: Canvas-sized RGBA overlay
+        color: RGB fill
+        alpha: Opacity of the shape
+        box: (x0, y0, x1, y1) bounds of the shape in canvas pixels
+        draw_mask: Called with (ImageDraw, dx, dy, alpha) to draw the shape
+            into the tile's 'L' mask, shifted by (dx, dy)
+    """
+    clipped = _clip_box(box, *overlay.size)
+    if clipped is None:
+        return
+    x0, y0, x1, y1 = clipped
+    mask = Image.new('L', (x1 - x0, y1 - y0), 0)
+    draw_mask(ImageDraw.Draw(mask), -x0, -y0, alpha)
+    tile = Image.new('RGBA', mask.size, (*color, 0))
+    tile.putalpha(mask)
+    overlay.alpha_composite(tile, (x0, y0))
+
+
+def _circles(overlay, rng, palette, width, height, scale):
+    for _ in range(rng.randint(3, 6)):
+        x = rng.randint(0, width)
+        y = rng.randint(0, height)
+        size = rng.randint(100, 400)
+        color, alpha = rng.choice(palette), rng.randint(30, 100)
+        x, y, size = x * scale, y * scale, size * scale
+        _composite(overlay, color, alpha, (x - size, y - size, x + size, y + size),
+                   lambda d, dx, dy, a: d.ellipse(
+                       [x - size + dx, y - size + dy, x + size + dx, y + size + dy], fill=a))
+
+
+def _lines(overlay, rng, palette, width, height, scale):
+    for _ in range(rng.randint(2, 4)):
+        x1 = rng.randint(0, width)
+        y1 = rng.randint(0, height)
+        x2 = rng.randint(0, width)
+        y2 = rng.randint(0, height)
+        color, alpha = rng.choice(palette), rng.randint(50, 150)
+        line_width = rng.randint(3, 8)
+        x1, y1, x2, y2 = x1 * scale, y1 * scale, x2 * scale, y2 * scale
+        line_width = max(1, int(round(line_width * scale)))
+        box = (min(x1, x2) - line_width, min(y1, y2) - line_width,
+               max(x1, x2) + line_width, max(y1, y2) + line_width)
+        _composite(overlay, color, alpha, box,
+                   lambda d, dx, dy, a: d.line(
+                       [(x1 + dx, y1 + dy), (x2 + dx, y2 + dy)], fill=a, width=line_width))
+
+
+def _rings(overlay, rng, palette, width, height, scale):
+    for _ in range(rng.randint(1, 3)):
+        x = rng.randint(0, width)
+        y = rng.randint(0, height)
+        size = rng.randint(80, 300)
+        ring_width = rng.randint(6, 20)
+        color, alpha = rng.choice(palette), rng.randint(40, 120)
+        x, y, size = x * scale, y * scale, size * scale
+        ring_width = max(1, int(round(ring_width * scale)))
+        _composite(overlay, color, alpha, (x - size, y - size, x + size, y + size),
+                   lambda d, dx, dy, a: d.ellipse(
+                       [x - size + dx, y - size + dy, x + size + dx, y + size + dy],
+                       outline=a, width=ring_width))
+
+
+def _blobs(overlay, rng, palette, width, height, scale):
+    for _ in range(rng.randint(1, 3)):
+        x = rng.randint(0, width)
+        y = rng.randint(0, height)
+        size = rng.randint(150, 350)
+        color, alpha = rng.choice(palette), rng.randint(30, 90)
+        # A circle whose radius wobbles with a few low harmonics
+        harmonics = [(k, rng.uniform(0, 0.15), rng.uniform(0, 2 * math.pi)) for k in (2, 3, 4)]
+        x, y, size = x * scale, y * scale, size * scale
+        points = []
+        for i in range(BLOB_POINTS):
+            theta = 2 * math.pi * i / BLOB_POINTS
+            r = size * (1 + sum(a * math.sin(k * theta + phase) for k, a, phase in harmonics))
+            points.append((x + r * math.cos(theta), y + r * math.sin(theta)))
+        box = (min(p[0] for p in points), min(p[1] for p in points),
+               max(p[0] for p in points), max(p[1] for p in points))
+        _composite(overlay, color, alpha, box,
+                   lambda d, dx, dy, a: d.polygon([(px + dx, py + dy) for px, py in points], fill=a))
+
+
+def _dots(overlay, rng, palette, width, height, scale):
+    cols, rows = rng.randint(4, 8), rng.randint(3, 6)
+    spacing = rng.randint(30, 60)
+    radius = rng.randint(4, 10)
+    x = rng.randint(0, max(0, width - cols * spacing))
+    y = rng.randint(0, max(0, height - rows * spacing))
+    color, alpha = rng.choice(palette), rng.randint(60, 160)
+    x, y, spacing, radius = x * scale, y * scale, spacing * scale, radius * scale
+
+    def draw_grid(d, dx, dy, a):
+        # Same color and opacity, so the whole grid is one tile
+        for row in range(rows):
+            for col in range(cols):
+                cx, cy = x + col * spacing + dx, y + row * spacing + dy
+                d.ellipse([cx - radius, cy - radius, cx + radius, cy + radius], fill=a)
+
+    box = (x - radius, y - radius, x + (cols - 1) * spacing + radius, y + (rows - 1) * spacing + radius)
+    _composite(overlay, color, alpha, box, draw_grid)
+
+
+_DRAWERS = {
+    "circles": _circles,
+    "lines": _lines,
+    "rings": _rings,
+    "blobs": _blobs,
+    "dots": _dots,
+}
+
+
+def render_decorations(seed: int, palette: Sequence[Tuple[int, int, int]],
+                       width: int, height: int,
+                       shapes: Sequence[str] = DEFAULT_SHAPES,
+                       scale: float = 1.0
+                       ) -> Tuple[Optional[Image.Image], Tuple[int, int]]:
+    """Draw a decoration set into a single RGBA overlay.
+
+    Each shape is drawn into a tile covering only its bounding box and
+    alpha-composited onto the overlay, so compositing the overlay once
+    gives the same image as painting the shapes one by one. Every kind
+    draws from its own stream derived from seed, so adding or removing a
+    kind leaves the others in place. Random draws are made in canvas
+    units and only then scaled, so every scale shows the same decorations.
+
+    Args:
+        seed: Decoration seed
+        palette: Colors the shapes are picked from
+        width: Canvas width in pixels
+        height: Canvas height in pixels
+        shapes: Kinds from DECORATION_SHAPES, drawn in order
+        scale: Raster scale; the overlay covers (width, height) * scale
+
+    Returns:
+        (overlay, (x, y)): the overlay cropped to its visible pixels and
+        where to paste it, or (None, (0, 0)) if nothing is visible
+    """
+    palette = list(palette)
+    overlay = Image.new('RGBA', scaled_size((width, height), scale), (0, 0, 0, 0))
+    for kind in shapes:
+        _DRAWERS[kind](overlay, random.Random(f"{seed}:{kind}"), palette, width, height, scale)
+
+    bbox = overlay.getchannel('A').getbbox()
+    if bbox is None:
+        return None, (0, 0)
+    return overlay.crop(bbox), bbox[:2]
+
+
+def parse_decorations(items: Optional[List[str]]) -> Optional[Tuple[str, ...]]:
+    """Validate the requested decoration kinds, or None to use DEFAULT_SHAPES.
+
+    An empty list disables decorations.
+    """
+    if items is None:
+        return None
+    if isinstance(items, str):
+        items = [items]
+    shapes = []
+    for item in items:
+        if item not in DECORATION_SHAPES:
+            print(f"⚠️  Warning: Unknown decoration '{item}', skipping")
+            continue
+        if item not in shapes:
+            shapes.append(item)
+    return tuple(shapes)
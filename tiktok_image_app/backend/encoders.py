@@ -0,0 +1,179 @@
+"""
+Output encoders for TikTok Image Generator
+Encodes renders as tuned PNG, WebP or JPEG, trading CPU against bytes
+"""
+
+import io
+import time
+from dataclasses import dataclass, replace
+from typing import BinaryIO, Dict, List, Optional, Sequence, Union
+
+from PIL import Image
+
+# Pillow format name -> file extension
+OUTPUT_FORMATS = {
+    "PNG": ".png",
+    "JPEG": ".jpg",
+    "WEBP": ".webp",
+}
+
+# zlib strategies for PNG. Pillow already picks the PNG row filter
+# adaptively; the strategy changes how zlib compresses the filtered rows.
+# "filtered" is Pillow's default; "rle" suits the long runs of gradient
+# backgrounds and is much faster.
+PNG_STRATEGIES = {
+    "filtered": 1,
+    "default": 0,
+    "huffman": 2,
+    "rle": 3,
+    "fixed": 4,
+}
+
+
+@dataclass(frozen=True)
+class OutputEncoding:
+    """How a render is encoded.
+
+    Attributes:
+        format: One of OUTPUT_FORMATS
+        quality: 1-100 for JPEG and lossy WebP
+        lossless: WebP only; lossless WebP ignores quality
+        compress_level: PNG zlib level, 0 (fastest) to 9 (smallest)
+        strategy: PNG zlib strategy, one of PNG_STRATEGIES
+        method: WebP effort, 0 (fastest) to 6 (smallest)
+        progressive: JPEG only; progressive scan order
+    """
+    format: str = "PNG"
+    quality: int = 90
+    lossless: bool = False
+    compress_level: int = 6
+    strategy: str = "filtered"
+    method: int = 4
+    progressive: bool = False
+
+    @property
+    def extension(self) -> str:
+        return OUTPUT_FORMATS.get(self.format, ".png")
+
+    @property
+    def mimetype(self) -> str:
+        return Image.MIME.get(self.format, "application/octet-stream")
+
+    def save_options(self) -> dict:
+        """Keyword arguments for Image.save in this encoding."""
+        if self.format == "PNG":
+            return {
+                'compress_level': self.compress_level,
+                'compress_type': PNG_STRATEGIES.get(self.strategy, 1),
+            }
+        if self.format == "WEBP":
+            if self.lossless:
+                return {'lossless': True, 'method': self.method}
+            return {'quality': self.quality, 'method': self.method}
+        if self.format == "JPEG":
+            return {'quality': self.quality, 'optimize': True, 'progressive': self.progressive}
+        return {}
+
+    def save(self, img: Image.Image, fp: Union[str, BinaryIO]) -> None:
+        """Encode img into a file path or binary stream."""
+        if self.format == "JPEG" and img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        img.save(fp, self.format, **self.save_options())
+
+    def encode(self, img: Image.Image) -> bytes:
+        """Encode img and return the bytes."""
+        buffer = io.BytesIO()
+        self.save(img, buffer)
+        return buffer.getvalue()
+
+
+# Named encodings selectable per request or as the server default
+ENCODING_PRESETS: Dict[str, OutputEncoding] = {
+    "png": OutputEncoding("PNG"),
+    "png-fast": OutputEncoding("PNG", compress_level=1, strategy="rle"),
+    "png-small": OutputEncoding("PNG", compress_level=9),
+    "webp": OutputEncoding("WEBP", quality=90),
+    "webp-lossless": OutputEncoding("WEBP", lossless=True, method=2),
+    "jpeg": OutputEncoding("JPEG", quality=90),
+}
+
+DEFAULT_ENCODING = ENCODING_PRESETS["png"]
+
+
+def parse_encoding(value: Union[None, str, dict],
+                   default: OutputEncoding = DEFAULT_ENCODING) -> OutputEncoding:
+    """Build an OutputEncoding from a preset name or an options object.
+
+    An object starts from its "preset" (or the format's defaults) and
+    overrides the given options, e.g. {"format": "webp", "quality": 80}.
+    Invalid values fall back to default with a warning.
+    """
+    if value is None:
+        return default
+    if isinstance(value, str):
+        preset = ENCODING_PRESETS.get(value.lower())
+        if preset is None:
+            print(f"⚠️  Warning: Unknown output format '{value}', using {default.format}")
+            return default
+        return preset
+    if not isinstance(value, dict):
+        print(f"⚠️  Warning: Invalid output format {value!r}, using {default.format}")
+        return default
+
+    base = ENCODING_PRESETS.get(str(value.get('preset', '')).lower())
+    if base is None:
+        name = str(value.get('format', default.format)).upper()
+        name = "JPEG" if name == "JPG" else name
+        if name not in OUTPUT_FORMATS:
+            print(f"⚠️  Warning: Unknown output format '{name}', using {default.format}")
+            return default
+        base = default if name == default.format else OutputEncoding(name)
+    try:
+        options = {}
+        for key, low, high in (('quality', 1, 100), ('compress_level', 0, 9), ('method', 0, 6)):
+            if value.get(key) is not None:
+                options[key] = max(low, min(high, int(value[key])))
+        for key in ('lossless', 'progressive'):
+            if value.get(key) is not None:
+                options[key] = bool(value[key])
+        if value.get('strategy') is not None:
+            if value['strategy'] not in PNG_STRATEGIES:
+                raise ValueError(f"unknown strategy {value['strategy']!r}")
+            options['strategy'] = value['strategy']
+    except (ValueError, TypeError) as e:
+        print(f"⚠️  Warning: Invalid output format options ({e}), using defaults")
+        return base
+    return replace(base, **options)
+
+
+def benchmark(img: Image.Image, encodings: Optional[Dict[str, OutputEncoding]] = None,
+              repeat: int = 3) -> List[dict]:
+    """Encode img with each encoding and measure time and size.
+
+    Args:
+        img: A representative render
+        encodings: Name -> encoding (ENCODING_PRESETS if None)
+        repeat: Encodes per encoding; the fastest is reported
+
+    Returns:
+        One {'name', 'format', 'seconds', 'bytes'} per encoding, smallest first
+    """
+    rows = []
+    for name, encoding in (encodings or ENCODING_PRESETS).items():
+        best = float('inf')
+        size = 0
+        for _ in range(max(1, repeat)):
+            start = time.perf_counter()
+            size = len(encoding.encode(img))
+            best = min(best, time.perf_counter() - start)
+        rows.append({'name': name, 'format': encoding.format, 'seconds': best, 'bytes': size})
+    return sorted(rows, key=lambda row: row['bytes'])
+
+
+def format_benchmark(rows: Sequence[dict]) -> str:
+    """Render benchmark() rows as a text table."""
+    lines = [f"{'encoding':<15} {'format':<6} {'encode ms':>10} {'KiB':>9}"]
+    for row in rows:
+        lines.append(f"{row['name']:<15} {row['format']:<6} "
+                     f"{row['seconds'] * 1000:>10.1f} {row['bytes'] / 1024:>9.1f}")
+    return "\n".join(lines)
@@ -0,0 +1,301 @@
+"""
+Font registry for TikTok Image Generator
+Discovers Unicode-capable fonts once and caches sized FreeType fonts
+"""
+
+import os
+import struct
+import unicodedata
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, FrozenSet, List, Optional, Sequence, Tuple
+
+from PIL import ImageFont
+
+
+# Fonts that support Amharic/Unicode (prioritized order)
+DEFAULT_FONT_PATHS = [
+    # macOS system fonts with Unicode support
+    "/System/Library/Fonts/Supplemental/Arial Unicode.ttf",
+    "/System/Library/Fonts/Supplemental/NotoSansEthiopic-Regular.ttf",
+    "/System/Library/Fonts/Supplemental/NotoSansEthiopic-Bold.ttf",
+    "/Library/Fonts/Arial Unicode.ttf",
+    "/System/Library/Fonts/Supplemental/AppleGothic.ttf",
+    "/System/Library/Fonts/Supplemental/STHeiti Light.ttc",
+    "/System/Library/Fonts/Supplemental/STHeiti Medium.ttc",
+    # Try Arial variants
+    "/System/Library/Fonts/Supplemental/Arial.ttf",
+    "/System/Library/Fonts/Supplemental/Arial Bold.ttf",
+    # Linux/Windows fallbacks
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    "/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf",
+    "C:/Windows/Fonts/arial.ttf",
+    "C:/Windows/Fonts/ARIALUNI.TTF",
+]
+
+# Directories scanned for any other fonts (lowest priority)
+DEFAULT_FONT_DIRS = [
+    "/System/Library/Fonts/Supplemental/",
+    "/Library/Fonts/",
+    "/usr/share/fonts/",
+]
+
+FONT_EXTENSIONS = ('.ttf', '.ttc', '.otf')
+
+
+@dataclass(frozen=True, eq=False)
+class FontFace:
+    """A discovered font file and the codepoints its cmap maps to glyphs."""
+    path: str
+    coverage: FrozenSet[int]
+
+    @property
+    def name(self) -> str:
+        return os.path.splitext(os.path.basename(self.path))[0]
+
+    def covers(self, text: str) -> bool:
+        """True if every non-whitespace character of text has a glyph."""
+        return all(ord(char) in self.coverage for char in text if not char.isspace())
+
+
+def read_cmap_coverage(path: str) -> FrozenSet[int]:
+    """Read the set of codepoints mapped by a font's Unicode cmap.
+
+    Supports TrueType/OpenType files and the first face of collections,
+    using cmap subtable format 12 (full Unicode) or format 4 (BMP).
+
+    Args:
+        path: Path to a .ttf/.otf/.ttc file
+
+    Returns:
+        Frozen set of covered codepoints (empty if the cmap can't be read)
+    """
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+
+        offset = 0
+        if data[:4] == b'ttcf':
+            offset = struct.unpack_from('>I', data, 12)[0]
+
+        num_tables = struct.unpack_from('>H', data, offset + 4)[0]
+        cmap = None
+        for i in range(num_tables):
+            tag, _, table_offset, _ = struct.unpack_from('>4sIII', data, offset + 12 + 16 * i)
+            if tag == b'cmap':
+                cmap = table_offset
+                break
+        if cmap is None:
+            return frozenset()
+
+        format4 = format12 = None
+        num_subtables = struct.unpack_from('>H', data, cmap + 2)[0]
+        for i in range(num_subtables):
+            platform, encoding, sub_offset = struct.unpack_from('>HHI', data, cmap + 4 + 8 * i)
+            sub = cmap + sub_offset
+            fmt = struct.unpack_from('>H', data, sub)[0]
+            if platform not in (0, 3) or (platform == 3 and encoding not in (1, 10)):
+                continue
+            if fmt == 12 and format12 is None:
+                format12 = sub
+            elif fmt == 4 and format4 is None:
+                format4 = sub
+
+        if format12 is not None:
+            return _read_cmap_format12(data, format12)
+        if format4 is not None:
+            return _read_cmap_format4(data, format4)
+    except (OSError, struct.error) as e:
+        print(f"⚠️  Warning: Could not read cmap of {path}: {e}")
+    return frozenset()
+
+
+def _read_cmap_format12(data: bytes, sub: int) -> FrozenSet[int]:
+    num_groups = struct.unpack_from('>I', data, sub + 12)[0]
+    codepoints = set()
+    for i in range(num_groups):
+        start, end, _ = struct.unpack_from('>III', data, sub + 16 + 12 * i)
+        codepoints.update(range(start, min(end, 0x10FFFF) + 1))
+    return frozenset(codepoints)
+
+
+def _read_cmap_format4(data: bytes, sub: int) -> FrozenSet[int]:
+    seg_count = struct.unpack_from('>H', data, sub + 6)[0] // 2
+    ends = struct.unpack_from(f'>{seg_count}H', data, sub + 14)
+    starts = struct.unpack_from(f'>{seg_count}H', data, sub + 16 + 2 * seg_count)
+    deltas = struct.unpack_from(f'>{seg_count}h', data, sub + 16 + 4 * seg_count)
+    range_offsets_at = sub + 16 + 6 * seg_count
+    range_offsets = struct.unpack_from(f'>{seg_count}H', data, range_offsets_at)
+
+    codepoints = set()
+    for i in range(seg_count):
+        start, end = starts[i], ends[i]
+        if start == 0xFFFF:
+            continue
+        if range_offsets[i] == 0:
+            codepoints.update(c for c in range(start, end + 1) if (c + deltas[i]) & 0xFFFF)
+            continue
+        for c in range(start, end + 1):
+            glyph_at = range_offsets_at + 2 * i + range_offsets[i] + 2 * (c - start)
+            if glyph_at + 2 <= len(data) and struct.unpack_from('>H', data, glyph_at)[0]:
+                codepoints.add(c)
+    return frozenset(codepoints)
+
+
+class FontRegistry:
+    """Index of available fonts, built once at startup.
+
+    Faces are kept in priority order together with their codepoint
+    coverage, and sized ``FreeTypeFont`` objects are served from an LRU
+    keyed by (face, size), so a cached lookup never touches the disk.
+    A coverage index (codepoint -> faces in priority order) drives the
+    per-codepoint fallback used for mixed-script text.
+    """
+
+    def __init__(self, preferred_paths: Optional[List[str]] = None,
+                 font_dirs: Optional[List[str]] = None, cache_size: int = 64,
+                 faces: Optional[List[FontFace]] = None):
+        """Discover fonts.
+
+        Args:
+            preferred_paths: Font files to try first, in priority order
+            font_dirs: Directories scanned (recursively) for other fonts
+            cache_size: Max number of (face, size) fonts kept open
+            faces: Already discovered faces in priority order; skips discovery
+        """
+        self.faces: List[FontFace] = []
+        self.font = lru_cache(maxsize=cache_size)(self._open_font)
+        if faces is None:
+            self._discover(list(preferred_paths or []) + DEFAULT_FONT_PATHS,
+                           DEFAULT_FONT_DIRS if font_dirs is None else font_dirs)
+        else:
+            self.faces = list(faces)
+        self._coverage_index = self._build_coverage_index()
+        self._faces_by_path = {face.path: face for face in self.faces}
+
+    def _discover(self, paths: List[str], font_dirs: List[str]) -> None:
+        for font_dir in font_dirs:
+            if not os.path.isdir(font_dir):
+                continue
+            for root, _, files in os.walk(font_dir):
+                for file in sorted(files):
+                    if file.lower().endswith(FONT_EXTENSIONS):
+                        paths.append(os.path.join(root, file))
+
+        seen = set()
+        for path in paths:
+            real_path = os.path.realpath(path)
+            if real_path in seen or not os.path.exists(path):
+                continue
+            seen.add(real_path)
+            try:
+                ImageFont.truetype(path, 20)
+            except Exception:
+                continue  # Not a font FreeType can load
+            self.faces.append(FontFace(path=path, coverage=read_cmap_coverage(path)))
+
+        print(f"✓ Font registry: {len(self.faces)} font(s) indexed")
+
+    def _build_coverage_index(self) -> Dict[int, Tuple[FontFace, ...]]:
+        index: Dict[int, List[FontFace]] = {}
+        for face in self.faces:
+            for codepoint in face.coverage:
+                index.setdefault(codepoint, []).append(face)
+        return {codepoint: tuple(faces) for codepoint, faces in index.items()}
+
+    def _open_font(self, face: FontFace, size: int) -> ImageFont.FreeTypeFont:
+        return ImageFont.truetype(face.path, size)
+
+    def prefer(self, fonts: Sequence[str]) -> "FontRegistry":
+        """A registry over the same faces that tries fonts first.
+
+        Sized fonts are shared with this registry, so nothing is reopened.
+
+        Args:
+            fonts: Paths or names (file name without extension) of indexed faces
+
+        Returns:
+            The new registry, or self if none of fonts is indexed
+        """
+        chosen: List[FontFace] = []
+        for font in fonts:
+            face = self._faces_by_path.get(font)
+            if face is None:
+                face = next((f for f in self.faces if f.name == font), None)
+            if face is None:
+                print(f"⚠️  Warning: Font '{font}' is not installed, skipping")
+                continue
+            if face not in chosen:
+                chosen.append(face)
+        if not chosen:
+            return self
+
+        registry = FontRegistry(faces=chosen + [f for f in self.faces if f not in chosen])
+        registry.font = self.font
+        return registry
+
+    def face_for_text(self, text: str) -> Optional[FontFace]:
+        """Pick the highest-priority face covering all of text.
+
+        Falls back to the face covering the most distinct characters.
+        """
+        if not self.faces:
+            return None
+        chars = {char for char in text if not char.isspace()}
+        best, best_count = self.faces[0], -1
+        for face in self.faces:
+            count = sum(1 for char in chars if ord(char) in face.coverage)
+            if count == len(chars):
+                return face
+            if count > best_count:
+                best, best_count = face, count
+        return best
+
+    def segment(self, text: str) -> List[Tuple[str, Optional[FontFace]]]:
+        """Split text into runs that can each be drawn with a single face.
+
+        One pass over the string: a run keeps its face while the face covers
+        the next character; otherwise the highest-priority face covering it
+        starts a new run. Whitespace, combining marks and characters no
+        font covers stay in the current run.
+
+        Args:
+            text: A single line of text
+
+        Returns:
+            List of (run_text, face) pairs; face is None if no fonts exist
+        """
+        runs = []
+        current: Optional[FontFace] = None
+        start = 0
+        for i, char in enumerate(text):
+            candidates = self._coverage_index.get(ord(char))
+            if not candidates or char.isspace() or unicodedata.combining(char):
+                continue
+            if current is None:
+                current = candidates[0]
+            elif current not in candidates:
+                runs.append((text[start:i], current))
+                current, start = candidates[0], i
+        if current is None:
+            current = self.faces[0] if self.faces else None
+        runs.append((text[start:], current))
+        return runs
+
+    def get_font(self, size: int, text: str = ""):
+        """Return a sized font for text, or PIL's default font if none exist."""
+        face = self.face_for_text(text)
+        if face is None:
+            return ImageFont.load_default()
+        return self.font(face, size)
+
+    def font_for_path(self, path: Optional[str], size: int):
+        """Sized font for a face recorded by path (e.g. in a text layout)."""
+        face = self._faces_by_path.get(path)
+        if face is None:
+            return ImageFont.load_default()
+        return self.font(face, size)
+
+    def cache_info(self):
+        """LRU statistics of the sized-font cache."""
+        return self.font.cache_info()
@@ -0,0 +1,207 @@
+"""
+Background generation jobs for TikTok Image Generator
+Renders batches off the request thread and records per-image progress
+"""
+
+import copy
+import json
+import os
+import re
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, List, Optional
+
+from batch_renderer import BatchResult
+
+# Job ids are uuid4 hex strings; anything else is rejected before touching disk
+JOB_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+
+class JobStore:
+    """Runs render jobs on a thread pool and keeps their status on disk.
+
+    Each job record is a small JSON file, rewritten atomically as images
+    complete. Every server process on the host can therefore answer
+    status requests, even for jobs another worker is running. Records of
+    finished jobs are deleted once they are older than the TTL.
+
+    A record names the process that runs it. If that process is gone
+    (killed on timeout, restarted, redeployed) while the job is queued or
+    running, the job is marked failed when next read or swept, and then
+    expires like any finished job.
+    """
+
+    def __init__(self, jobs_dir: str, workers: int = 2, ttl: float = 3600.0,
+                 stale_after: float = 1800.0):
+        """Initialize the store.
+
+        Args:
+            jobs_dir: Directory holding job records
+            workers: Jobs rendered concurrently by this process
+            ttl: Seconds a finished job's record is kept
+            stale_after: Seconds without progress after which an unfinished
+                job whose process can't be checked (another host) is failed
+        """
+        self.jobs_dir = jobs_dir
+        self.ttl = ttl
+        self.stale_after = stale_after
+        self.host = socket.gethostname()
+        os.makedirs(jobs_dir, exist_ok=True)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="render-job")
+        self._lock = threading.Lock()
+
+    def _path(self, job_id: str) -> str:
+        return os.path.join(self.jobs_dir, f"{job_id}.json")
+
+    def _write(self, record: dict) -> None:
+        path = self._path(record['id'])
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(record, f)
+        os.replace(tmp_path, path)
+
+    def submit(self, count: int, render: Callable[[], Iterable[BatchResult]],
+               meta: Optional[dict] = None) -> dict:
+        """Queue a batch and return its initial record.
+
+        Args:
+            count: Number of images in the batch
+            render: Called on a pool thread; yields one BatchResult per
+                image, in any order, as each completes
+            meta: Extra JSON fields stored in the record (e.g. seeds)
+
+        Returns:
+            The queued job record
+        """
+        self.sweep()
+        now = time.time()
+        record = {
+            'id': uuid.uuid4().hex,
+            'status': 'queued',
+            'created_at': now,
+            'updated_at': now,
+            'finished_at': None,
+            'host': self.host,
+            'pid': os.getpid(),
+            'count': count,
+            'completed': 0,
+            'failed': 0,
+            'images': [{'index': i, 'status': 'pending'} for i in range(count)],
+        }
+        record.update(meta or {})
+        self._write(record)
+        # The pool thread owns record from here on
+        snapshot = copy.deepcopy(record)
+        self._executor.submit(self._run, record, render)
+        return snapshot
+
+    def _run(self, record: dict, render: Callable[[], Iterable[BatchResult]]) -> None:
+        record['status'] = 'running'
+        record['updated_at'] = time.time()
+        self._write(record)
+        try:
+            for result in render():
+                image = {'index': result.index, 'seconds': round(result.seconds, 4),
+                         'encode_seconds': round(result.encode_seconds, 4)}
+                if result.ok:
+                    image.update(status='done', filename=os.path.basename(result.path))
+                    if result.target_paths:
+                        # Target files are named <name>_<width>x<height>
+                        image['target_filenames'] = {
+                            os.path.splitext(path)[0].rsplit('_', 1)[-1]: os.path.basename(path)
+                            for path in result.target_paths
+                        }
+                    record['completed'] += 1
+                else:
+                    image.update(status='failed', error=result.error)
+                    record['failed'] += 1
+                record['images'][result.index] = image
+                record['updated_at'] = time.time()
+                self._write(record)
+            record['status'] = 'done' if record['completed'] else 'failed'
+        except Exception as e:
+            print(f"⚠️  Warning: Job {record['id']} failed: {e}")
+            record['status'] = 'failed'
+            record['error'] = str(e)
+        record['finished_at'] = record['updated_at'] = time.time()
+        self._write(record)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        """Return a job's record, or None if unknown or expired."""
+        if not JOB_ID_PATTERN.match(job_id or ''):
+            return None
+        try:
+            with open(self._path(job_id)) as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            return None
+        now = time.time()
+        if self._orphaned(record, now):
+            self._interrupt(record, now)
+        if self._expired(record, now):
+            self._remove(job_id)
+            return None
+        return record
+
+    def _expired(self, record: dict, now: float) -> bool:
+        finished_at = record.get('finished_at')
+        return finished_at is not None and now - finished_at > self.ttl
+
+    def _orphaned(self, record: dict, now: float) -> bool:
+        """Whether an unfinished job lost the process running it."""
+        if record.get('finished_at') is not None:
+            return False
+        if record.get('host') == self.host and record.get('pid'):
+            try:
+                os.kill(record['pid'], 0)
+            except ProcessLookupError:
+                return True
+            except OSError:
+                # Exists, but owned by another user
+                pass
+            return False
+        return now - record.get('updated_at', 0) > self.stale_after
+
+    def _interrupt(self, record: dict, now: float) -> None:
+        """Mark an orphaned job failed, so it expires after the TTL."""
+        print(f"⚠️  Warning: Job {record['id']} lost its server process, marking it failed")
+        record['status'] = 'failed'
+        record['error'] = 'Job interrupted: the server process running it stopped'
+        record['finished_at'] = record['updated_at'] = now
+        self._write(record)
+
+    def _remove(self, job_id: str) -> None:
+        try:
+            os.remove(self._path(job_id))
+        except OSError:
+            pass
+
+    def sweep(self) -> List[str]:
+        """Delete records of jobs that finished more than ttl seconds ago.
+
+        Unfinished jobs whose process is gone are marked failed first.
+
+        Returns:
+            Ids of the removed jobs
+        """
+        removed = []
+        now = time.time()
+        with self._lock:
+            for name in os.listdir(self.jobs_dir):
+                job_id, ext = os.path.splitext(name)
+                if ext != '.json' or not JOB_ID_PATTERN.match(job_id):
+                    continue
+                try:
+                    with open(os.path.join(self.jobs_dir, name)) as f:
+                        record = json.load(f)
+                except (OSError, ValueError):
+                    continue
+                if self._orphaned(record, now):
+                    self._interrupt(record, now)
+                if self._expired(record, now):
+                    self._remove(job_id)
+                    removed.append(job_id)
+        return removed
@@ -0,0 +1,262 @@
+"""
+Gradient engine for TikTok Image Generator
+Computes multi-stop gradient backgrounds as NumPy array operations
+"""
+
+import math
+import numpy as np
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+
+DEFAULT_COLOR = (255, 255, 255)
+
+# Legacy directions keep their exact per-row/per-column LUTs
+LEGACY_DIRECTIONS = ("vertical", "horizontal", "diagonal")
+GRADIENT_MODES = LEGACY_DIRECTIONS + ("angle", "radial", "conic", "multi_radial")
+
+# Resolution of the LUT used by field-based modes
+LUT_SIZE = 1024
+
+
+@dataclass(frozen=True)
+class GradientSpec:
+    """Immutable description of a gradient's geometry.
+
+    Attributes:
+        mode: One of GRADIENT_MODES
+        angle: Degrees, clockwise from left-to-right ('angle' mode) or the
+            start angle of a 'conic' sweep
+        center: Relative (x, y) center for 'radial' and 'conic'
+        centers: Relative (x, y) centers for 'multi_radial'
+        radius: Relative radius where the last stop is reached
+            (None or not positive = farthest corner)
+        stops: Optional stop positions in [0, 1], one per color
+    """
+    mode: str = "vertical"
+    angle: float = 0.0
+    center: Tuple[float, float] = (0.5, 0.5)
+    centers: Tuple[Tuple[float, float], ...] = ()
+    radius: Optional[float] = None
+    stops: Optional[Tuple[float, ...]] = None
+
+
+def sanitize_colors(colors) -> List[Tuple[int, int, int]]:
+    """Validate a palette once and clamp every channel to 0-255.
+
+    Invalid entries are skipped with a warning. An empty result falls
+    back to a single white stop so callers always get a usable palette.
+
+    Args:
+        colors: Iterable of RGB tuples/lists
+
+    Returns:
+        List of (r, g, b) integer tuples
+    """
+    if not colors or len(colors) == 0:
+        print("⚠️  Warning: No colors provided, using default white")
+        return [DEFAULT_COLOR]
+
+    valid_colors = []
+    for i, color in enumerate(colors):
+        if not isinstance(color, (tuple, list)) or len(color) < 3:
+            print(f"⚠️  Warning: Invalid color at index {i}: {color}, skipping")
+            continue
+        try:
+            r = max(0, min(255, int(color[0])))
+            g = max(0, min(255, int(color[1])))
+            b = max(0, min(255, int(color[2])))
+            valid_colors.append((r, g, b))
+        except (ValueError, TypeError, IndexError) as e:
+            print(f"⚠️  Warning: Error processing color {color}: {e}, skipping")
+            continue
+
+    if len(valid_colors) == 0:
+        print("⚠️  Warning: No valid colors after filtering, using default white")
+        valid_colors = [DEFAULT_COLOR]
+
+    return valid_colors
+
+
+def interpolate_lut(colors: List[Tuple[int, int, int]],
+                    ratios: np.ndarray) -> np.ndarray:
+    """Evaluate the multi-stop gradient at every ratio in one pass.
+
+    Matches the scalar ``_interpolate_color`` exactly: evenly spaced stops,
+    ratio clamped to [0, 1] and channels truncated to integers.
+
+    Args:
+        colors: Sanitized palette (see ``sanitize_colors``)
+        ratios: 1-D float array of positions along the gradient
+
+    Returns:
+        uint8 array of shape (len(ratios), 3)
+    """
+    palette = np.asarray(colors, dtype=np.float64)
+    ratios = np.clip(np.asarray(ratios, dtype=np.float64), 0, 1)
+    if len(palette) == 1:
+        return np.repeat(palette.astype(np.uint8), len(ratios), axis=0)
+
+    segment = ratios * (len(palette) - 1)
+    index = np.clip(segment.astype(np.intp), 0, len(palette) - 2)
+    t = (segment - index)[:, None]
+    c1 = palette[index]
+    c2 = palette[index + 1]
+    return (c1 + (c2 - c1) * t).astype(np.uint8)
+
+
+def build_lut(colors: List[Tuple[int, int, int]],
+              stops: Optional[Tuple[float, ...]] = None,
+              size: int = LUT_SIZE) -> np.ndarray:
+    """Sample the gradient into a fixed-size lookup table.
+
+    Args:
+        colors: Sanitized palette (see ``sanitize_colors``)
+        stops: Optional stop positions, one per color; evenly spaced if None
+        size: Number of LUT entries
+
+    Returns:
+        uint8 array of shape (size, 3)
+    """
+    ratios = np.linspace(0, 1, size)
+    stops = _validate_stops(colors, stops)
+    if stops is None:
+        return interpolate_lut(colors, ratios)
+
+    palette = np.asarray(colors, dtype=np.float64)
+    lut = np.empty((size, 3), dtype=np.uint8)
+    for channel in range(3):
+        lut[:, channel] = np.interp(ratios, stops, palette[:, channel]).astype(np.uint8)
+    return lut
+
+
+def _validate_stops(colors, stops) -> Optional[np.ndarray]:
+    """Return stops as a sorted array, or None to fall back to even spacing."""
+    if stops is None:
+        return None
+    if len(stops) != len(colors) or len(colors) < 2:
+        print(f"⚠️  Warning: {len(stops)} stops for {len(colors)} colors, using even spacing")
+        return None
+    try:
+        values = np.clip(np.asarray(stops, dtype=np.float64), 0, 1)
+    except (ValueError, TypeError) as e:
+        print(f"⚠️  Warning: Invalid gradient stops {stops}: {e}, using even spacing")
+        return None
+    return np.maximum.accumulate(values)
+
+
+def ratio_field(spec: GradientSpec, width: int, height: int) -> np.ndarray:
+    """Compute the per-pixel gradient position for a field-based mode.
+
+    Coordinates are built as separable 1-D axes and broadcast, so every
+    mode costs a handful of whole-array operations. Everything stays in
+    float32 and later steps work in place on the first full-size array.
+
+    Args:
+        spec: Gradient geometry
+        width: Image width in pixels
+        height: Image height in pixels
+
+    Returns:
+        float32 array of shape (height, width) with values in [0, 1]
+    """
+    xs = np.arange(width, dtype=np.float32)
+    ys = np.arange(height, dtype=np.float32)
+
+    if spec.mode == "angle":
+        theta = math.radians(spec.angle)
+        dx, dy = math.cos(theta), math.sin(theta)
+        px = xs * np.float32(dx)
+        py = ys * np.float32(dy)
+        # Normalize so the projections of the image corners span [0, 1];
+        # offset and scale are applied to the 1-D projections, leaving a
+        # single full-size add
+        low = min(px[0], px[-1]) + min(py[0], py[-1])
+        high = max(px[0], px[-1]) + max(py[0], py[-1])
+        span = np.float32((high - low) or 1.0)
+        return ((py - low) / span)[:, None] + (px / span)[None, :]
+
+    if spec.mode == "conic":
+        cx, cy = spec.center[0] * width, spec.center[1] * height
+        turn = np.arctan2((ys - np.float32(cy))[:, None], (xs - np.float32(cx))[None, :])
+        turn -= np.float32(math.radians(spec.angle))
+        turn *= np.float32(1 / (2 * math.pi))
+        # Wrap into [0, 1); np.mod is several times slower on float32
+        turn -= np.floor(turn)
+        return turn
+
+    # radial / multi_radial: distance to the (nearest) center
+    centers = spec.centers if spec.mode == "multi_radial" and spec.centers else (spec.center,)
+    distance = np.empty((height, width), dtype=np.float32)
+    scratch = None
+    for i, (rel_x, rel_y) in enumerate(centers):
+        cx, cy = rel_x * width, rel_y * height
+        dy_sq = np.square(ys - np.float32(cy))[:, None]
+        dx_sq = np.square(xs - np.float32(cx))[None, :]
+        if i == 0:
+            np.add(dy_sq, dx_sq, out=distance)
+        else:
+            # One scratch buffer for every further center
+            scratch = np.add(dy_sq, dx_sq, out=scratch)
+            np.minimum(distance, scratch, out=distance)
+
+    if spec.radius and spec.radius > 0:
+        radius = spec.radius * max(width, height)
+    else:
+        cx, cy = centers[0][0] * width, centers[0][1] * height
+        radius = math.hypot(max(cx, width - cx), max(cy, height - cy))
+    np.sqrt(distance, out=distance)
+    distance *= np.float32(1 / (radius or 1.0))
+    return np.minimum(distance, np.float32(1.0), out=distance)
+
+
+def render_gradient(colors: List[Tuple[int, int, int]], width: int, height: int,
+                    direction="vertical") -> np.ndarray:
+    """Render a gradient background as an RGB array.
+
+    Legacy directions evaluate the palette once into a 1-D lookup table
+    which is broadcast (vertical/horizontal) or indexed by ``x + y``
+    (diagonal). Other modes go coordinate field -> ratio field -> LUT.
+
+    Args:
+        colors: Sanitized palette (see ``sanitize_colors``)
+        width: Image width in pixels
+        height: Image height in pixels
+        direction: A GRADIENT_MODES name or a GradientSpec
+
+    Returns:
+        uint8 array of shape (height, width, 3)
+    """
+    spec = direction if isinstance(direction, GradientSpec) else GradientSpec(mode=direction)
+    if spec.mode not in GRADIENT_MODES:
+        print(f"⚠️  Warning: Unknown gradient mode '{spec.mode}', using vertical")
+        spec = GradientSpec(mode="vertical", stops=spec.stops)
+
+    stops = _validate_stops(colors, spec.stops)
+    if stops is None:
+        if spec.mode == "vertical":
+            lut = interpolate_lut(colors, np.arange(height) / height)
+            return np.ascontiguousarray(np.broadcast_to(lut[:, None, :], (height, width, 3)))
+        if spec.mode == "horizontal":
+            lut = interpolate_lut(colors, np.arange(width) / width)
+            return np.ascontiguousarray(np.broadcast_to(lut[None, :, :], (height, width, 3)))
+        if spec.mode == "diagonal":
+            # ratio only depends on x + y, so a LUT over the anti-diagonals suffices
+            lut = interpolate_lut(colors, np.arange(width + height - 1) / (width + height))
+            diagonal_index = np.arange(height)[:, None] + np.arange(width)[None, :]
+            return np.take(lut, diagonal_index, axis=0)
+
+    if spec.mode in LEGACY_DIRECTIONS:
+        # Custom stops: express the legacy direction as an angle
+        angle = {"vertical": 90.0, "horizontal": 0.0, "diagonal": 45.0}[spec.mode]
+        spec = GradientSpec(mode="angle", angle=angle, stops=spec.stops)
+
+    lut = build_lut(colors, spec.stops if stops is not None else None)
+    # Clamp, scale and round the field in place (a negative ratio would wrap
+    # around in uint16); a uint16 index and np.take gather whole RGB rows
+    # of the LUT, much faster than fancy indexing
+    field = ratio_field(spec, width, height)
+    np.clip(field, 0, 1, out=field)
+    field *= np.float32(LUT_SIZE - 1)
+    field += np.float32(0.5)
+    return np.take(lut, field.astype(np.uint16), axis=0)
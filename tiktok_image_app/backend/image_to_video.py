@@ -4,49 +4,68 @@ Converts PNG images to MP4 videos for TikTok upload
 """
 
 import os
+import uuid
 from PIL import Image
 import numpy as np
 from moviepy.editor import ImageClip, concatenate_videoclips
 import tempfile
 
 
-def image_to_video(image_path, output_path=None, duration=5, fps=30, fade_duration=0.5):
+def _load_frame(image, size=None):
+    """RGB frame array of an image path, PIL image or array.
+    
+    moviepy takes the array directly, so no temporary image file is written.
+    Images are rendered natively at their canvas size, so they are only
+    resized when size is given; otherwise an odd width or height is
+    cropped by one pixel, as libx264 needs even dimensions.
+    """
+    if isinstance(image, np.ndarray):
+        img = Image.fromarray(image)
+    elif isinstance(image, Image.Image):
+        img = image
+    else:
+        img = Image.open(image)
+    img = img.convert('RGB')
+    
+    if size is not None and img.size != tuple(size):
+        img = img.resize(tuple(size), Image.Resampling.LANCZOS)
+    width, height = img.size
+    if width % 2 or height % 2:
+        img = img.crop((0, 0, width - width % 2, height - height % 2))
+    return np.asarray(img)
+
+
+def image_to_video(image_path, output_path=None, duration=5, fps=30, fade_duration=0.5, size=None):
     """
     Convert a single image to a video file.
     
     Args:
-        image_path: Path to input image (PNG, JPG, etc.)
+        image_path: Path to input image (PNG, JPG, etc.), or the image itself
+            as a PIL image or array (e.g. straight from the renderer)
         output_path: Path to output video file (optional, auto-generated if None)
         duration: Video duration in seconds (default: 5)
         fps: Frames per second (default: 30)
         fade_duration: Fade in/out duration in seconds (default: 0.5)
+        size: (width, height) of the video (default: the image's own size)
         
     Returns:
         str: Path to generated video file
     """
     if output_path is None:
-        base_name = os.path.splitext(os.path.basename(image_path))[0]
-        output_dir = os.path.dirname(image_path) or "output"
-        output_path = os.path.join(output_dir, f"{base_name}.mp4")
+        if isinstance(image_path, (str, os.PathLike)):
+            base_name = os.path.splitext(os.path.basename(image_path))[0]
+            output_dir = os.path.dirname(image_path) or "output"
+            output_path = os.path.join(output_dir, f"{base_name}.mp4")
+        else:
+            # In-memory image: nothing to name the video after
+            output_path = os.path.join(tempfile.gettempdir(), f"tiktok_video_{uuid.uuid4().hex}.mp4")
     
     # Ensure output directory exists
     os.makedirs(os.path.dirname(output_path), exist_ok=True)
     
     try:
-        # Load image
-        img = Image.open(image_path)
-        
-        # Resize to TikTok dimensions if needed (1080x1920)
-        target_size = (1080, 1920)
-        if img.size != target_size:
-            img = img.resize(target_size, Image.Resampling.LANCZOS)
-        
-        # Save to temporary file for moviepy
-        temp_img_path = tempfile.mktemp(suffix='.png')
-        img.save(temp_img_path, 'PNG')
-        
-        # Create video clip from image
-        clip = ImageClip(temp_img_path, duration=duration)
+        # Create video clip from the image's pixels
+        clip = ImageClip(_load_frame(image_path, size), duration=duration)
         
         # Add fade in/out effects
         if fade_duration > 0:
@@ -66,10 +85,6 @@ def image_to_video(image_path, output_path=None, duration=5, fps=30, fade_durati
             logger=None  # Suppress moviepy logs
         )
         
-        # Clean up temporary file
-        if os.path.exists(temp_img_path):
-            os.remove(temp_img_path)
-        
         # Clean up clip
         clip.close()
         
@@ -78,46 +93,39 @@ def image_to_video(image_path, output_path=None, duration=5, fps=30, fade_durati
         
     except Exception as e:
         print(f"✗ Error converting image to video: {e}")
-        # Clean up on error
-        if 'temp_img_path' in locals() and os.path.exists(temp_img_path):
-            os.remove(temp_img_path)
         raise
 
 
-def images_to_video(image_paths, output_path=None, duration_per_image=5, fps=30, transition_duration=0.5):
+def images_to_video(image_paths, output_path=None, duration_per_image=5, fps=30, transition_duration=0.5,
+                    size=None):
     """
     Convert multiple images to a single video (slideshow style).
     
     Args:
-        image_paths: List of image file paths
+        image_paths: List of image file paths (or PIL images / arrays)
         output_path: Path to output video file
         duration_per_image: Duration for each image in seconds
         fps: Frames per second
         transition_duration: Transition duration between images
+        size: (width, height) of the video (default: the first image's size)
         
     Returns:
         str: Path to generated video file
     """
     if output_path is None:
-        output_dir = os.path.dirname(image_paths[0]) if image_paths else "output"
-        output_path = os.path.join(output_dir, "tiktok_video.mp4")
+        first = image_paths[0] if image_paths else None
+        output_dir = os.path.dirname(first) if isinstance(first, (str, os.PathLike)) else "output"
+        output_path = os.path.join(output_dir or "output", "tiktok_video.mp4")
     
     try:
         clips = []
         
         for i, image_path in enumerate(image_paths):
-            # Load and resize image
-            img = Image.open(image_path)
-            target_size = (1080, 1920)
-            if img.size != target_size:
-                img = img.resize(target_size, Image.Resampling.LANCZOS)
-            
-            # Save to temporary file
-            temp_img_path = tempfile.mktemp(suffix='.png')
-            img.save(temp_img_path, 'PNG')
-            
-            # Create clip
-            clip = ImageClip(temp_img_path, duration=duration_per_image)
+            # Create clip from the image's pixels
+            frame = _load_frame(image_path, size)
+            # Every slide is scaled to the first one's size
+            size = size or (frame.shape[1], frame.shape[0])
+            clip = ImageClip(frame, duration=duration_per_image)
             
             # Add fade effects
             if transition_duration > 0:
@@ -148,12 +156,6 @@ def images_to_video(image_paths, output_path=None, duration_per_image=5, fps=30,
             clip.close()
         final_clip.close()
         
-        # Clean up temp files
-        for image_path in image_paths:
-            temp_path = tempfile.mktemp(suffix='.png')
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
-        
         print(f"✓ Created slideshow video: {output_path}")
         return output_path
         
@@ -0,0 +1,190 @@
+"""
+Output retention for TikTok Image Generator
+Keeps the output directory within an age and size budget
+"""
+
+import os
+import threading
+import time
+from typing import List, Optional, Tuple
+
+
+class OutputRetention:
+    """Evicts generated files by age and total size, least recently used first.
+
+    A file's last use is its access time, which touch() bumps whenever the
+    file is served or reused (mount options like noatime make the kernel's
+    own atime unreliable). Access times live on the file itself, so every
+    server process sharing the directory sees the same order.
+
+    sweep() runs on a background thread every `interval` seconds:
+      1. files unused for longer than max_age are deleted
+      2. while the directory holds more than max_bytes, the least recently
+         used files are deleted until it is down to low_water * max_bytes
+    Files younger than min_age are never evicted, so images of a batch in
+    progress survive until the client had a chance to fetch them.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 512 * 1024 * 1024,
+                 max_age: float = 24 * 3600.0, interval: float = 300.0,
+                 min_age: float = 120.0, low_water: float = 0.9):
+        """Initialize the policy.
+
+        Args:
+            directory: Directory to keep in budget
+            max_bytes: Size budget of the directory (0 = unlimited)
+            max_age: Seconds since last use before a file expires (0 = never)
+            interval: Seconds between background sweeps
+            min_age: Seconds since last write during which a file is kept
+            low_water: Fraction of max_bytes an over-budget sweep evicts down to
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.interval = interval
+        self.min_age = min_age
+        self.low_water = low_water
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+        self.bytes_held = 0
+        self.files_held = 0
+        self.evictions = 0
+        self.freed_bytes = 0
+        self.expirations = 0
+        self.sweeps = 0
+        self.last_sweep_at = None
+        self.last_sweep_seconds = 0.0
+
+    def touch(self, path: str, resolution: float = 60.0) -> None:
+        """Record a use of path, keeping its mtime (and ETag) unchanged.
+
+        Args:
+            path: File that was served or reused
+            resolution: Skip the update if the recorded use is this recent
+        """
+        try:
+            stat = os.stat(path)
+            now = time.time()
+            if now - stat.st_atime > resolution:
+                os.utime(path, ns=(int(now * 1e9), stat.st_mtime_ns))
+        except OSError:
+            pass
+
+    def _scan(self) -> List[Tuple[float, float, int, str]]:
+        """(last_used, modified, size, path) of every file in the directory."""
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                try:
+                    if not entry.is_file(follow_symlinks=False):
+                        continue
+                    stat = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                last_used = max(stat.st_atime, stat.st_mtime)
+                entries.append((last_used, stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def _remove(self, path: str) -> bool:
+        try:
+            os.remove(path)
+            return True
+        except FileNotFoundError:
+            # Another server process evicted it first
+            return False
+        except OSError as e:
+            print(f"⚠️  Warning: Could not evict {path}: {e}")
+            return False
+
+    def sweep(self, now: Optional[float] = None) -> dict:
+        """Apply the policy once.
+
+        Returns:
+            Counts of this sweep: expired and evicted files, bytes freed
+        """
+        start = time.perf_counter()
+        now = time.time() if now is None else now
+        entries = sorted(self._scan())
+        total = sum(size for _, _, size, _ in entries)
+        expired = evicted = freed = 0
+        budget = self.max_bytes
+
+        kept = 0
+        # Oldest use first: entries are sorted by last use
+        for last_used, modified, size, path in entries:
+            if now - modified < self.min_age:
+                kept += 1
+                continue
+            if self.max_age and now - last_used > self.max_age:
+                if self._remove(path):
+                    expired += 1
+                    freed += size
+                total -= size
+                continue
+            if budget and total > budget:
+                if self._remove(path):
+                    evicted += 1
+                    freed += size
+                total -= size
+                # Once over budget, evict down to the low-water mark so
+                # the next few renders don't trigger another eviction
+                budget = int(self.max_bytes * self.low_water)
+                continue
+            kept += 1
+
+        with self._lock:
+            self.bytes_held = total
+            self.files_held = kept
+            self.expirations += expired
+            self.evictions += evicted
+            self.freed_bytes += freed
+            self.sweeps += 1
+            self.last_sweep_at = now
+            self.last_sweep_seconds = time.perf_counter() - start
+        return {'expired': expired, 'evicted': evicted, 'freed_bytes': freed}
+
+    def _loop(self) -> None:
+        # First sweep right away: cleans up after a restart and fills in stats
+        while True:
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"⚠️  Warning: Output sweep failed: {e}")
+            if self._stop.wait(self.interval):
+                return
+
+    def start(self) -> None:
+        """Start the background sweeper in this process (idempotent).
+
+        Safe to call on every request: after a fork (e.g. gunicorn
+        --preload) the child starts its own sweeper.
+        """
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._loop, name="output-retention", daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'bytes_held': self.bytes_held,
+                'files_held': self.files_held,
+                'max_bytes': self.max_bytes,
+                'max_age': self.max_age,
+                'evictions': self.evictions,
+                'freed_bytes': self.freed_bytes,
+                'expirations': self.expirations,
+                'sweeps': self.sweeps,
+                'last_sweep_at': self.last_sweep_at,
+                'last_sweep_seconds': round(self.last_sweep_seconds, 4),
+            }
@@ -0,0 +1,94 @@
+"""
+Content-addressed output naming for TikTok Image Generator
+Names files by what they render and tags them by what they contain
+"""
+
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Tuple
+
+from render_spec import RenderSpec
+
+# Bump when a change to rendering makes equal specs produce different pixels,
+# so stale files are no longer matched
+STORE_VERSION = 1
+
+# Prefix of content-addressed files; the rest of the name is the key, plus
+# the size of an extra render target
+CONTENT_PREFIX = "tiktok_"
+CONTENT_NAME_PATTERN = re.compile(r'^tiktok_[0-9a-f]{32}(_[0-9]+x[0-9]+)?\.[a-z]+$')
+
+
+def content_key(text: str, spec: RenderSpec, salt: str = "") -> str:
+    """Hash of everything an image depends on.
+
+    Renders are deterministic for a seeded spec, so equal keys mean
+    byte-identical images and an existing file can stand in for a render.
+
+    Args:
+        text: Text content of the image
+        spec: Render inputs; must be seeded
+        salt: Renderer state outside the spec (e.g. the installed fonts)
+
+    Returns:
+        32 hex characters
+    """
+    if spec.seed is None:
+        raise ValueError("Only seeded specs are content-addressable")
+    # Specs are frozen dataclasses of tuples, strings and numbers, whose
+    # repr is stable across processes
+    payload = repr((STORE_VERSION, salt, text, spec)).encode('utf-8')
+    return hashlib.sha256(payload).hexdigest()[:32]
+
+
+def content_name(text: str, spec: RenderSpec, salt: str = "") -> str:
+    """File name (without extension) of a content-addressed image."""
+    return CONTENT_PREFIX + content_key(text, spec, salt)
+
+
+def target_name(name: str, size: Tuple[int, int]) -> str:
+    """File name of the render target of the given size of image name."""
+    return f"{name}_{size[0]}x{size[1]}"
+
+
+def is_content_addressed(filename: str) -> bool:
+    """Whether filename names an immutable content-addressed image."""
+    return bool(CONTENT_NAME_PATTERN.match(os.path.basename(filename)))
+
+
+class ETagIndex:
+    """Strong ETags (hash of the file bytes) of served images.
+
+    Hashes are kept per (path, size, mtime), so a file is read once per
+    process however often it is served, and a replaced file is rehashed.
+    """
+
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self._etags = OrderedDict()
+        self._lock = threading.Lock()
+
+    def etag(self, path: str) -> str:
+        """Return the ETag of the file at path (without quotes)."""
+        stat = os.stat(path)
+        key = (path, stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            etag = self._etags.get(key)
+            if etag is not None:
+                self._etags.move_to_end(key)
+                return etag
+
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        etag = digest.hexdigest()[:32]
+
+        with self._lock:
+            self._etags[key] = etag
+            while len(self._etags) > self.max_entries:
+                self._etags.popitem(last=False)
+        return etag
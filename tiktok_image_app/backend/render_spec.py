@@ -0,0 +1,90 @@
+"""
+Render specification for TikTok Image Generator
+Everything a single render depends on, as one immutable value
+"""
+
+from dataclasses import dataclass
+from typing import Optional, Tuple, Union
+
+from encoders import DEFAULT_ENCODING, OutputEncoding
+from gradients import GradientSpec
+from text_effects import TextEffect
+from text_layout import TextBox
+
+# TikTok standard dimensions (vertical format)
+DEFAULT_SIZE = (1080, 1920)
+
+# Named canvas sizes accepted as render targets
+CANVAS_PRESETS = {
+    "9:16": (1080, 1920),
+    "4:5": (1080, 1350),
+    "1:1": (1080, 1080),
+    "16:9": (1920, 1080),
+}
+
+
+@dataclass(frozen=True)
+class RenderSpec:
+    """Immutable inputs of one render, passed explicitly to the generator.
+
+    The generator keeps no per-request state, so specs can be rendered
+    concurrently from several threads. Specs are hashable and can key
+    caches.
+
+    Attributes:
+        palette: Background colors; None picks a standard palette with seed
+        direction: Gradient direction name or GradientSpec; None picks a
+            legacy direction with seed
+        seed: Seed of the render's random choices (text color, decoration
+            set, and palette/direction when left None); None draws one
+        fonts: Font files or names tried before the registry's order
+        effects: Text effect layers (DEFAULT_EFFECTS if None)
+        text_box: Auto-fit box for the font size (length heuristic if None)
+        decorations: Decoration kinds (DEFAULT_SHAPES if None)
+        decoration_seed: Decoration set shared across renders (drawn from
+            seed if None)
+        size: (width, height) of the canvas the composition is laid out on
+        targets: Further canvas sizes rendered in the same pass, sharing
+            the text layout (see TikTokImageGenerator.render_targets)
+        scale: Raster scale; a preview at 0.25 renders the same composition
+            at a quarter of size in each dimension
+        encoding: Output format and encoder options
+    """
+    palette: Optional[Tuple[Tuple[int, int, int], ...]] = None
+    direction: Optional[Union[str, GradientSpec]] = None
+    seed: Optional[int] = None
+    fonts: Tuple[str, ...] = ()
+    effects: Optional[Tuple[TextEffect, ...]] = None
+    text_box: Optional[TextBox] = None
+    decorations: Optional[Tuple[str, ...]] = None
+    decoration_seed: Optional[int] = None
+    size: Tuple[int, int] = DEFAULT_SIZE
+    targets: Tuple[Tuple[int, int], ...] = ()
+    scale: float = 1.0
+    encoding: OutputEncoding = DEFAULT_ENCODING
+
+    @property
+    def extension(self) -> str:
+        return self.encoding.extension
+
+    @property
+    def pixel_size(self) -> Tuple[int, int]:
+        """(width, height) of the rendered image: size times scale."""
+        return scaled_size(self.size, self.scale)
+
+
+def canvas_unit(size: Tuple[int, int]) -> float:
+    """Pixels per standard pixel on a canvas: its short side over 1080.
+
+    Font sizes, margins, effects and decorations are specified for the
+    standard canvas and multiplied by this, so each canvas size gets the
+    same proportions natively.
+    """
+    return min(size) / DEFAULT_SIZE[0]
+
+
+def scaled_size(size: Tuple[int, int], scale: float) -> Tuple[int, int]:
+    """Pixel size of a canvas rasterized at scale (at least 1x1)."""
+    if scale == 1.0:
+        return tuple(size)
+    return max(1, int(round(size[0] * scale))), max(1, int(round(size[1] * scale)))
@@ -0,0 +1,108 @@
+"""
+Request coalescing for TikTok Image Generator
+Runs identical concurrent calls once and shares the result
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Tuple
+
+
+class _Call:
+    """A call in flight; waiters block on done."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalesces calls by key, like Go's singleflight.
+
+    While a call for a key runs, further calls with that key wait for it
+    and receive the same value (or exception) instead of running again.
+    A completed value is also reused by calls arriving within `ttl`
+    seconds; failures are never reused.
+    """
+
+    def __init__(self, ttl: float = 10.0, max_entries: int = 256):
+        """Initialize the group.
+
+        Args:
+            ttl: Seconds a completed value stays reusable (0 disables reuse)
+            max_entries: Most completed values kept; the oldest are dropped
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._calls = {}
+        self._done = OrderedDict()  # key -> (finished_at, value)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.coalesced = 0
+        self.reused = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any],
+           reusable: Callable[[Any], bool] = lambda value: True) -> Tuple[Any, bool]:
+        """Run fn once for all concurrent callers with the same key.
+
+        Args:
+            key: Fingerprint of the call
+            fn: Work to run when no call for key is in flight or reusable
+            reusable: Whether a value may be kept for the reuse window
+
+        Returns:
+            (value, shared): shared is True if the value came from another
+            caller's run
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._expire(now)
+            if key in self._done:
+                self.reused += 1
+                return self._done[key][1], True
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.calls += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value, True
+
+        try:
+            call.value = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                if call.error is None and self.ttl > 0 and reusable(call.value):
+                    self._done[key] = (time.monotonic(), call.value)
+                    while len(self._done) > self.max_entries:
+                        self._done.popitem(last=False)
+            call.done.set()
+        return call.value, False
+
+    def _expire(self, now: float) -> None:
+        while self._done:
+            key, (finished_at, _) = next(iter(self._done.items()))
+            if now - finished_at <= self.ttl:
+                break
+            del self._done[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'in_flight': len(self._calls),
+                'reusable': len(self._done),
+                'calls': self.calls,
+                'coalesced': self.coalesced,
+                'reused': self.reused,
+            }
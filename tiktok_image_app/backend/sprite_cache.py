@@ -0,0 +1,81 @@
+"""
+Sprite cache for TikTok Image Generator
+Byte-budgeted LRU of rendered layers (text lines, decoration overlays)
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+from PIL import Image
+
+
+def _image_bytes(image: Image.Image) -> int:
+    return image.width * image.height * len(image.getbands())
+
+
+class SpriteCache:
+    """Byte-budgeted LRU of rendered RGBA sprites.
+
+    Keys must identify everything that affects a sprite's pixels (e.g. a
+    text line's runs, faces, size, effects and colors, or a decoration
+    set's seed and palette), so a repeated layer is a single paste.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        """Initialize the cache.
+
+        Args:
+            max_bytes: Budget for the sum of cached sprite sizes in bytes
+        """
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[tuple, Tuple[Any, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: tuple, sprite: Any, nbytes: Optional[int] = None) -> None:
+        """Cache sprite under key.
+
+        Args:
+            key: Everything the sprite's pixels depend on
+            sprite: An image, or any value holding one (then pass nbytes)
+            nbytes: Size charged against the budget (from the image if None)
+        """
+        if nbytes is None:
+            nbytes = _image_bytes(sprite)
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old[1]
+            self._entries[key] = (sprite, nbytes)
+            self.bytes += nbytes
+            while self.bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.bytes -= evicted
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        """Counters for sizing the cache."""
+        return {
+            'entries': len(self._entries),
+            'bytes': self.bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
@@ -0,0 +1,173 @@
+"""
+Text effects for TikTok Image Generator
+Derives outline, drop shadow and glow from a single rasterized text mask
+"""
+
+import math
+from dataclasses import dataclass, replace
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+from PIL import Image, ImageFilter
+
+EFFECT_TYPES = ("outline", "shadow", "glow")
+
+# Per-type defaults for fields a request leaves out
+EFFECT_DEFAULTS = {
+    "outline": {"radius": 3, "offset": (0, 0), "blur": 0, "opacity": 255},
+    "shadow": {"radius": 0, "offset": (6, 6), "blur": 4, "opacity": 160},
+    "glow": {"radius": 4, "offset": (0, 0), "blur": 8, "opacity": 200},
+}
+
+
+@dataclass(frozen=True)
+class TextEffect:
+    """One effect layer drawn underneath the text.
+
+    Attributes:
+        type: 'outline' (dilated mask), 'shadow' (offset, optionally
+            blurred mask) or 'glow' (dilated and blurred mask); selects
+            the defaults used by ``parse_effects``
+        radius: Dilation radius in pixels
+        offset: (dx, dy) shift of the effect layer
+        blur: Gaussian blur radius in pixels
+        color: RGB color; None picks black or white to contrast the text
+        opacity: 0-255 multiplier applied to the effect mask
+
+    Pixel values are for the standard-width canvas; the generator scales
+    them with the canvas and raster size.
+    """
+    type: str = "outline"
+    radius: int = 3
+    offset: Tuple[int, int] = (0, 0)
+    blur: float = 0.0
+    color: Optional[Tuple[int, int, int]] = None
+    opacity: int = 255
+
+    @property
+    def padding(self) -> int:
+        """Pixels the effect can extend beyond the text mask."""
+        return (self.radius + int(math.ceil(self.blur * 3))
+                + max(abs(self.offset[0]), abs(self.offset[1])))
+
+    def scaled(self, scale: float) -> "TextEffect":
+        """The same effect for a raster drawn at scale."""
+        if scale == 1.0:
+            return self
+        return replace(
+            self,
+            radius=int(round(self.radius * scale)),
+            offset=(int(round(self.offset[0] * scale)), int(round(self.offset[1] * scale))),
+            blur=self.blur * scale,
+        )
+
+    def resolve_color(self, text_color: Tuple[int, int, int]) -> Tuple[int, int, int]:
+        if self.color is not None:
+            return self.color
+        return (0, 0, 0) if text_color == (255, 255, 255) else (255, 255, 255)
+
+
+# Equivalent of the former 7x7 square of offset shadow draws
+DEFAULT_EFFECTS: Tuple[TextEffect, ...] = (TextEffect(type="outline", radius=3),)
+
+
+def dilate(mask: np.ndarray, radius: int) -> np.ndarray:
+    """Square dilation as two separable running maxima (O(radius) array ops)."""
+    if radius <= 0:
+        return mask
+    out = mask.copy()
+    for k in range(1, radius + 1):
+        np.maximum(out[:, k:], mask[:, :-k], out=out[:, k:])
+        np.maximum(out[:, :-k], mask[:, k:], out=out[:, :-k])
+    rows = out.copy()
+    for k in range(1, radius + 1):
+        np.maximum(out[k:], rows[:-k], out=out[k:])
+        np.maximum(out[:-k], rows[k:], out=out[:-k])
+    return out
+
+
+def effect_mask(mask: Image.Image, effect: TextEffect) -> Image.Image:
+    """Derive an effect's coverage mask from the text mask.
+
+    The result has the same size as mask; the mask must already be padded
+    by at least ``effect.padding`` pixels on every side.
+    """
+    pixels = np.asarray(mask)
+    if effect.radius > 0:
+        pixels = dilate(pixels, effect.radius)
+    dx, dy = effect.offset
+    if dx or dy:
+        pixels = np.roll(pixels, (dy, dx), axis=(0, 1))
+    if effect.opacity < 255:
+        pixels = (pixels.astype(np.uint16) * effect.opacity // 255).astype(np.uint8)
+
+    result = Image.fromarray(np.ascontiguousarray(pixels))
+    if effect.blur > 0:
+        result = result.filter(ImageFilter.GaussianBlur(effect.blur))
+    return result
+
+
+def render_line_sprite(mask: Image.Image, text_color: Tuple[int, int, int],
+                       effects: Sequence[TextEffect] = DEFAULT_EFFECTS) -> Image.Image:
+    """Composite effect layers and the text into one RGBA sprite.
+
+    Pasting the sprite through its own alpha gives the same result as
+    painting each layer in order, in a single paste.
+
+    Args:
+        mask: Padded 'L' mask of the rasterized text
+        text_color: RGB fill of the text
+        effects: Effect layers, painted in order underneath the text
+
+    Returns:
+        RGBA image the size of mask
+    """
+    sprite = Image.new('RGBA', mask.size, (0, 0, 0, 0))
+    layers = [(effect.resolve_color(text_color), effect_mask(mask, effect)) for effect in effects]
+    layers.append((text_color, mask))
+    for color, alpha in layers:
+        layer = Image.new('RGBA', mask.size, (*color, 0))
+        layer.putalpha(alpha)
+        sprite.alpha_composite(layer)
+    return sprite
+
+
+def max_padding(effects: Sequence[TextEffect]) -> int:
+    """Padding needed around a text mask so no effect gets clipped."""
+    return max((effect.padding for effect in effects), default=0)
+
+
+def parse_effects(items: Optional[List[dict]]) -> Optional[Tuple[TextEffect, ...]]:
+    """Build effects from request JSON, or None to use DEFAULT_EFFECTS.
+
+    Each item looks like {"type": "shadow", "radius": 0, "offset": {"x": 6,
+    "y": 6}, "blur": 4, "color": {"r": 0, "g": 0, "b": 0}, "opacity": 160}.
+    An empty list disables effects. radius, blur and each offset component
+    are capped at 50 px, which bounds the masks drawn per line.
+    """
+    if items is None:
+        return None
+    effects = []
+    for item in items:
+        if not isinstance(item, dict) or item.get('type') not in EFFECT_TYPES:
+            print(f"⚠️  Warning: Invalid text effect {item}, skipping")
+            continue
+        defaults = EFFECT_DEFAULTS[item['type']]
+        try:
+            offset = item.get('offset') or defaults['offset']
+            if isinstance(offset, dict):
+                offset = (offset.get('x', 0), offset.get('y', 0))
+            color = item.get('color')
+            if isinstance(color, dict):
+                color = (color.get('r', 0), color.get('g', 0), color.get('b', 0))
+            effects.append(TextEffect(
+                type=item['type'],
+                radius=max(0, min(50, int(item.get('radius', defaults['radius'])))),
+                offset=(max(-50, min(50, int(offset[0]))), max(-50, min(50, int(offset[1])))),
+                blur=max(0.0, min(50.0, float(item.get('blur', defaults['blur'])))),
+                color=tuple(max(0, min(255, int(c))) for c in color[:3]) if color else None,
+                opacity=max(0, min(255, int(item.get('opacity', defaults['opacity'])))),
+            ))
+        except (ValueError, TypeError, IndexError) as e:
+            print(f"⚠️  Warning: Invalid text effect {item}: {e}, skipping")
+    return tuple(effects)
@@ -0,0 +1,344 @@
+"""
+Text measurement and layout for TikTok Image Generator
+Caches word advances per font so wrapping sums widths instead of re-measuring lines
+"""
+
+import math
+from dataclasses import asdict, dataclass, replace
+from functools import lru_cache
+from typing import Callable, List, Optional, Tuple
+
+from PIL import Image, ImageDraw, ImageFont
+
+from font_registry import FontRegistry
+
+# Estimates within this fraction of the font size of the wrap width are
+# re-measured as a whole line, so kerning can't push a line past the edge
+KERNING_SLACK = 0.1
+
+# Line height as a multiple of the font size
+LINE_SPACING = 1.4
+
+
+@dataclass(frozen=True)
+class TextBox:
+    """Layout box for auto-fitted text, in pixels of the standard-width canvas.
+
+    Values scale with the canvas width, so a box keeps its proportions on
+    other canvas sizes.
+
+    Attributes:
+        margin_x: Horizontal margin on each side
+        margin_y: Vertical margin on each side
+        min_size: Smallest font size auto-fit may choose
+        max_size: Largest font size auto-fit may choose
+    """
+    margin_x: int = 100
+    margin_y: int = 200
+    min_size: int = 32
+    max_size: int = 160
+
+
+@dataclass(frozen=True)
+class LayoutRun:
+    """A same-font piece of a line.
+
+    Attributes:
+        text: Run text
+        font_path: Font file of the face (None for PIL's default font)
+        x: Offset of the run from the line's left edge
+        advance: Advance width of the run
+    """
+    text: str
+    font_path: Optional[str]
+    x: float
+    advance: float
+
+
+@dataclass(frozen=True)
+class LayoutLine:
+    """A positioned line; (x, y) is the left end of its ascender line."""
+    text: str
+    x: int
+    y: int
+    width: float
+    runs: Tuple[LayoutRun, ...]
+
+
+@dataclass(frozen=True)
+class TextLayout:
+    """Measured and positioned text, independent of any raster.
+
+    Built once per (text, box) and reusable for full-size renders,
+    previews and video frames: rasterizing at another scale multiplies
+    positions and the font size without measuring again.
+    """
+    text: str
+    font_size: int
+    line_height: int
+    ascent: int
+    descent: int
+    canvas: Tuple[int, int]
+    lines: Tuple[LayoutLine, ...]
+
+    @property
+    def line_count(self) -> int:
+        return len(self.lines)
+
+    @property
+    def bbox(self) -> Tuple[float, float, float, float]:
+        """(left, top, right, bottom) of the text in canvas pixels."""
+        if not self.lines:
+            return (0, 0, 0, 0)
+        return (
+            min(line.x for line in self.lines),
+            self.lines[0].y,
+            max(line.x + line.width for line in self.lines),
+            self.lines[-1].y + self.ascent + self.descent,
+        )
+
+    def recentered(self, canvas: Tuple[int, int]) -> "TextLayout":
+        """The same lines, centered on another canvas instead.
+
+        Lets canvases of other aspect ratios share one measured layout.
+        """
+        dx = (canvas[0] - self.canvas[0]) // 2
+        dy = (canvas[1] - self.canvas[1]) // 2
+        if dx == 0 and dy == 0 and tuple(canvas) == self.canvas:
+            return self
+        return replace(
+            self,
+            canvas=tuple(canvas),
+            lines=tuple(replace(line, x=line.x + dx, y=line.y + dy) for line in self.lines),
+        )
+
+    def to_dict(self) -> dict:
+        """JSON-serializable form (see ``from_dict``)."""
+        data = asdict(self)
+        data['bbox'] = self.bbox
+        return data
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "TextLayout":
+        lines = tuple(
+            LayoutLine(
+                text=line['text'], x=line['x'], y=line['y'], width=line['width'],
+                runs=tuple(LayoutRun(**run) for run in line['runs']),
+            )
+            for line in data['lines']
+        )
+        return cls(
+            text=data['text'], font_size=data['font_size'], line_height=data['line_height'],
+            ascent=data['ascent'], descent=data['descent'], canvas=tuple(data['canvas']),
+            lines=lines,
+        )
+
+
+class TextMeasurer:
+    """Cached advance widths of words and runs per (font, size).
+
+    Wrapping sums cached word advances plus the space advance, and only
+    measures the joined line when the estimate lands next to the wrap
+    width (the candidate break).
+    """
+
+    def __init__(self, fonts: FontRegistry, cache_size: int = 8192):
+        """Initialize the measurer.
+
+        Args:
+            fonts: Registry used for per-codepoint font fallback
+            cache_size: Max number of (text, font) advances kept
+        """
+        self.fonts = fonts
+        self.advance = lru_cache(maxsize=cache_size)(self._measure)
+
+    def runs(self, text: str, font) -> List[Tuple[str, ImageFont.FreeTypeFont]]:
+        """Split text into same-font runs at the size of font."""
+        if not isinstance(font, ImageFont.FreeTypeFont):
+            return [(text, font)]
+        return [(run, self.fonts.font(face, font.size) if face else font)
+                for run, face in self.fonts.segment(text)]
+
+    def _measure(self, text: str, font) -> float:
+        return sum(run_font.getlength(run) for run, run_font in self.runs(text, font))
+
+    def wrap(self, text: str, font, max_width: float) -> List[Tuple[str, float]]:
+        """Greedy word wrap using cached advances.
+
+        Args:
+            text: Paragraph to wrap (no newlines)
+            font: Base font
+            max_width: Maximum line width in pixels
+
+        Returns:
+            List of (line, width) pairs; widths can be reused when drawing
+        """
+        space = self.advance(' ', font)
+        slack = KERNING_SLACK * getattr(font, 'size', 0)
+        lines = []
+        current: List[str] = []
+        width = 0.0
+
+        for word in text.split():
+            word_width = self.advance(word, font)
+            if not current:
+                current, width = [word], word_width
+                continue
+
+            candidate = width + space + word_width
+            if abs(candidate - max_width) <= slack:
+                # Kerning-aware correction, only at the candidate break
+                candidate = self.advance(' '.join(current + [word]), font)
+
+            if candidate <= max_width:
+                current.append(word)
+                width = candidate
+            else:
+                lines.append((' '.join(current), width))
+                current, width = [word], word_width
+
+        if current:
+            lines.append((' '.join(current), width))
+
+        return lines if lines else [(text, self.advance(text, font))]
+
+    def cache_info(self):
+        """LRU statistics of the advance cache."""
+        return self.advance.cache_info()
+
+
+def wrap_paragraphs(measurer: TextMeasurer, text: str, font,
+                    max_width: float) -> List[Tuple[str, float]]:
+    """Wrap every paragraph of text, separated by empty spacer lines.
+
+    Explicit newlines are preserved as paragraph breaks.
+
+    Returns:
+        List of (line, width) pairs; spacer lines are ("", 0)
+    """
+    all_lines: List[Tuple[str, float]] = []
+    for paragraph in text.split('\n'):
+        if paragraph.strip():
+            all_lines.extend(measurer.wrap(paragraph.strip(), font, max_width))
+            all_lines.append(("", 0))  # Empty line for spacing
+
+    # Remove trailing empty line
+    if all_lines and not all_lines[-1][0]:
+        all_lines.pop()
+    return all_lines
+
+
+def fit_text(measurer: TextMeasurer, text: str, font_for_size: Callable[[int], object],
+             box_width: float, box_height: float, min_size: int,
+             max_size: int) -> Tuple[int, List[Tuple[str, float]]]:
+    """Binary-search the largest font size whose wrapped text fits a box.
+
+    Only cached advance measurements are used; nothing is rasterized.
+
+    Args:
+        measurer: Text measurer (its cache is shared across sizes)
+        text: Full text, possibly with newlines
+        font_for_size: Returns the base font for a size
+        box_width: Available width in pixels
+        box_height: Available height in pixels
+        min_size: Lower bound, returned even if it doesn't fit
+        max_size: Upper bound
+
+    Returns:
+        (font_size, lines) for the chosen size
+    """
+    best_size = min_size
+    best_lines = None
+    low, high = min_size, max_size
+    while low <= high:
+        size = (low + high) // 2
+        lines = wrap_paragraphs(measurer, text, font_for_size(size), box_width)
+        height = len(lines) * int(size * LINE_SPACING)
+        if height <= box_height and all(width <= box_width for _, width in lines):
+            best_size, best_lines = size, lines
+            low = size + 1
+        else:
+            high = size - 1
+
+    if best_lines is None:
+        best_lines = wrap_paragraphs(measurer, text, font_for_size(min_size), box_width)
+    return best_size, best_lines
+
+
+def build_layout(measurer: TextMeasurer, text: str, font, font_size: int,
+                 wrapped: List[Tuple[str, float]], canvas: Tuple[int, int]) -> TextLayout:
+    """Position wrapped lines centered on the canvas.
+
+    Args:
+        measurer: Measurer used for run segmentation and cached advances
+        text: Full text
+        font: Base font the lines were wrapped with
+        font_size: Size of font
+        wrapped: (line, width) pairs from wrapping; "" lines are spacers
+        canvas: (width, height) of the target image
+
+    Returns:
+        TextLayout with one entry per non-spacer line
+    """
+    width, height = canvas
+    line_height = int(font_size * LINE_SPACING)
+    if isinstance(font, ImageFont.FreeTypeFont):
+        ascent, descent = font.getmetrics()
+    else:
+        ascent, descent = line_height, 0
+
+    # Center vertically
+    start_y = (height - len(wrapped) * line_height) // 2
+
+    lines = []
+    for i, (line, line_width) in enumerate(wrapped):
+        if not line:  # Spacer between paragraphs
+            continue
+        runs = []
+        x = 0.0
+        for run, run_font in measurer.runs(line, font):
+            advance = measurer.advance(run, run_font)
+            runs.append(LayoutRun(text=run, font_path=getattr(run_font, 'path', None),
+                                  x=x, advance=advance))
+            x += advance
+        lines.append(LayoutLine(
+            text=line,
+            x=int((width - line_width) // 2),  # Center horizontally
+            y=start_y + i * line_height,
+            width=line_width,
+            runs=tuple(runs),
+        ))
+
+    return TextLayout(
+        text=text, font_size=font_size, line_height=line_height,
+        ascent=ascent, descent=descent, canvas=(width, height), lines=tuple(lines),
+    )
+
+
+def rasterize_line(layout: TextLayout, line: LayoutLine, fonts: FontRegistry,
+                   scale: float = 1.0, pad: int = 0) -> Image.Image:
+    """Draw one layout line into an 'L' coverage mask.
+
+    Args:
+        layout: Layout the line belongs to
+        line: Line to draw
+        fonts: Registry resolving run font paths to sized fonts
+        scale: Raster scale relative to the layout's canvas
+        pad: Empty border around the line box, in raster pixels
+
+    Returns:
+        Mask whose (pad, pad) pixel corresponds to (line.x, line.y) * scale
+    """
+    size = max(1, round(layout.font_size * scale))
+    ascent = round(layout.ascent * scale)
+    descent = round(layout.descent * scale)
+    mask = Image.new('L', (int(math.ceil(line.width * scale)) + 2 * pad, ascent + descent + 2 * pad), 0)
+    draw = ImageDraw.Draw(mask)
+    for run in line.runs:
+        font = fonts.font_for_path(run.font_path, size)
+        x = pad + run.x * scale
+        if isinstance(font, ImageFont.FreeTypeFont):
+            draw.text((x, pad + ascent), run.text, font=font, fill=255, anchor="ls")
+        else:
+            draw.text((x, pad), run.text, font=font, fill=255)
+    return mask
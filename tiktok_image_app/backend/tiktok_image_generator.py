@@ -3,28 +3,78 @@ TikTok Image Generator
 Generates attractive, dynamic images with text content optimized for TikTok.
 """
 
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageFont
 import random
 import os
-from typing import List, Tuple
+import threading
+from typing import BinaryIO, List, Optional, Sequence, Tuple, Union
 import math
 import re
 import urllib.request
 import shutil
+from dataclasses import replace
+from functools import lru_cache
+
+from gradients import LEGACY_DIRECTIONS, GradientSpec, sanitize_colors
+from background_atlas import BackgroundAtlas
+from font_registry import FontRegistry
+from text_layout import (
+    TextBox, TextLayout, TextMeasurer, build_layout, fit_text, rasterize_line, wrap_paragraphs,
+)
+from text_effects import DEFAULT_EFFECTS, TextEffect, max_padding, render_line_sprite
+from decorations import DEFAULT_SHAPES, render_decorations
+from sprite_cache import SpriteCache
+from render_spec import DEFAULT_SIZE, RenderSpec, canvas_unit, scaled_size
+from encoders import ENCODING_PRESETS, benchmark, format_benchmark
+from output_store import content_name
+from batch_renderer import BatchRenderer, BatchResult, RenderJob, run_job
 
 
 class TikTokImageGenerator:
-    """Generate TikTok-optimized images with text content."""
+    """Generate TikTok-optimized images with text content.
+    
+    The generator only holds fonts, constants and thread-safe caches. Each
+    render takes its inputs from an explicit RenderSpec, so one instance
+    can serve concurrent requests.
+    """
     
     # TikTok standard dimensions (vertical format)
-    WIDTH = 1080
-    HEIGHT = 1920
+    WIDTH, HEIGHT = DEFAULT_SIZE
+    
+    # Color palettes for dynamic backgrounds
+    COLOR_PALETTES = (
+        # Vibrant gradients
+        ((255, 107, 107), (255, 159, 64), (255, 206, 84)),
+        ((72, 219, 251), (163, 230, 53), (18, 183, 106)),
+        ((255, 77, 77), (255, 184, 0), (255, 255, 0)),
+        ((138, 43, 226), (255, 20, 147), (255, 105, 180)),
+        ((0, 191, 255), (0, 250, 154), (50, 205, 50)),
+        # Modern pastels
+        ((255, 182, 193), (255, 218, 185), (255, 239, 213)),
+        ((173, 216, 230), (176, 224, 230), (175, 238, 238)),
+        # Bold and dark
+        ((25, 25, 112), (72, 61, 139), (123, 104, 238)),
+        ((139, 0, 0), (178, 34, 34), (220, 20, 60)),
+        # Energetic
+        ((255, 69, 0), (255, 140, 0), (255, 215, 0)),
+    )
+    
+    # Text colors (high contrast for readability)
+    TEXT_COLORS = (
+        (255, 255, 255),  # White
+        (0, 0, 0),         # Black
+        (255, 255, 255),  # White
+        (255, 255, 255),  # White
+        (0, 0, 0),         # Black
+    )
     
-    def __init__(self, output_dir: str = "output"):
+    def __init__(self, output_dir: str = "output", preload_atlas: bool = False):
         """Initialize the generator.
         
         Args:
             output_dir: Directory to save generated images
+            preload_atlas: Map (and build if needed) the pre-rendered
+                background atlas now instead of rendering on demand
         """
         self.output_dir = output_dir
         os.makedirs(output_dir, exist_ok=True)
@@ -32,93 +82,57 @@ class TikTokImageGenerator:
         os.makedirs(self.font_cache_dir, exist_ok=True)
         # Ensure Noto Sans Ethiopic is available
         self._ensure_noto_font()
-        
-        # Color palettes for dynamic backgrounds
-        self.color_palettes = [
-            # Vibrant gradients
-            [(255, 107, 107), (255, 159, 64), (255, 206, 84)],
-            [(72, 219, 251), (163, 230, 53), (18, 183, 106)],
-            [(255, 77, 77), (255, 184, 0), (255, 255, 0)],
-            [(138, 43, 226), (255, 20, 147), (255, 105, 180)],
-            [(0, 191, 255), (0, 250, 154), (50, 205, 50)],
-            # Modern pastels
-            [(255, 182, 193), (255, 218, 185), (255, 239, 213)],
-            [(173, 216, 230), (176, 224, 230), (175, 238, 238)],
-            # Bold and dark
-            [(25, 25, 112), (72, 61, 139), (123, 104, 238)],
-            [(139, 0, 0), (178, 34, 34), (220, 20, 60)],
-            # Energetic
-            [(255, 69, 0), (255, 140, 0), (255, 215, 0)],
-        ]
-        
-        # Text colors (high contrast for readability)
-        self.text_colors = [
-            (255, 255, 255),  # White
-            (0, 0, 0),         # Black
-            (255, 255, 255),  # White
-            (255, 255, 255),  # White
-            (0, 0, 0),         # Black
-        ]
+        # Index fonts and their codepoint coverage once
+        self.fonts = FontRegistry(
+            preferred_paths=[os.path.join(self.font_cache_dir, "NotoSansEthiopic-Regular.ttf")]
+        )
+        self.measurer = TextMeasurer(self.fonts)
+        self._measurers = lru_cache(maxsize=16)(self._build_measurer)
+        self._layouts = lru_cache(maxsize=256)(self._build_layout)
+        self.line_cache = SpriteCache()
+        # Decoration overlays of fixed decoration seeds, keyed by seed and
+        # palette (per-image seeds never repeat, so they aren't cached)
+        self.decoration_cache = SpriteCache(max_bytes=32 * 1024 * 1024)
+        # Backgrounds with decorations, for renders that can share them
+        # (fixed decoration seed or no decorations)
+        self.layer_cache = SpriteCache(max_bytes=96 * 1024 * 1024)
+        
+        # Standard backgrounds are shared via a memory-mapped atlas;
+        # custom palettes go into a bounded LRU next to it
+        self.backgrounds = BackgroundAtlas(
+            self.COLOR_PALETTES, self.WIDTH, self.HEIGHT,
+            cache_dir=os.path.join(os.path.expanduser("~"), ".tiktok_cache"),
+        )
+        if preload_atlas:
+            self.backgrounds.load()
+    
+    @property
+    def color_palettes(self) -> Tuple[Tuple[Tuple[int, int, int], ...], ...]:
+        """Standard palettes (read-only; pass custom ones in a RenderSpec)."""
+        return self.COLOR_PALETTES
+    
+    @property
+    def text_colors(self) -> Tuple[Tuple[int, int, int], ...]:
+        return self.TEXT_COLORS
     
     def create_gradient_background(self, colors: List[Tuple[int, int, int]],
-                                   direction: str = "vertical") -> Image.Image:
+                                   direction: Union[str, GradientSpec] = "vertical",
+                                   size: Optional[Tuple[int, int]] = None) -> Image.Image:
         """Create a gradient background.
         
         Args:
             colors: List of RGB color tuples
-            direction: 'vertical', 'horizontal', or 'diagonal'
+            direction: 'vertical', 'horizontal', 'diagonal', or a GradientSpec
+                for angle/radial/conic/multi_radial modes and custom stops
+            size: (width, height) of the background (standard size if None)
             
         Returns:
             PIL Image with gradient background
         """
-        # Validate and sanitize colors
-        if not colors or len(colors) == 0:
-            print("⚠️  Warning: No colors provided, using default white")
-            colors = [(255, 255, 255)]
-        
-        # Filter and validate each color
-        valid_colors = []
-        for i, color in enumerate(colors):
-            if not isinstance(color, (tuple, list)) or len(color) < 3:
-                print(f"⚠️  Warning: Invalid color at index {i}: {color}, skipping")
-                continue
-            try:
-                # Ensure all values are integers in valid range
-                r = max(0, min(255, int(color[0])))
-                g = max(0, min(255, int(color[1])))
-                b = max(0, min(255, int(color[2])))
-                valid_colors.append((r, g, b))
-            except (ValueError, TypeError, IndexError) as e:
-                print(f"⚠️  Warning: Error processing color {color}: {e}, skipping")
-                continue
-        
-        if len(valid_colors) == 0:
-            print("⚠️  Warning: No valid colors after filtering, using default white")
-            valid_colors = [(255, 255, 255)]
-        
-        colors = valid_colors
-        
-        img = Image.new('RGB', (self.WIDTH, self.HEIGHT))
-        draw = ImageDraw.Draw(img)
-        
-        if direction == "vertical":
-            for y in range(self.HEIGHT):
-                ratio = y / self.HEIGHT
-                color = self._interpolate_color(colors, ratio)
-                draw.line([(0, y), (self.WIDTH, y)], fill=color)
-        elif direction == "horizontal":
-            for x in range(self.WIDTH):
-                ratio = x / self.WIDTH
-                color = self._interpolate_color(colors, ratio)
-                draw.line([(x, 0), (x, self.HEIGHT)], fill=color)
-        else:  # diagonal
-            for y in range(self.HEIGHT):
-                for x in range(self.WIDTH):
-                    ratio = (x + y) / (self.WIDTH + self.HEIGHT)
-                    color = self._interpolate_color(colors, ratio)
-                    draw.point((x, y), fill=color)
-        
-        return img
+        # Start from the cached (read-only) background and copy it into a
+        # fresh image that later stages can draw on
+        pixels = self.backgrounds.get(colors, direction, size)
+        return Image.fromarray(pixels)
     
     def _interpolate_color(self, colors: List[Tuple[int, int, int]], 
                           ratio: float) -> Tuple[int, int, int]:
@@ -176,30 +190,115 @@ class TikTokImageGenerator:
             int(c1[2] + (c2[2] - c1[2]) * t)
         )
     
-    def add_decorative_elements(self, img: Image.Image) -> Image.Image:
-        """Add decorative elements to make the image more attractive."""
-        draw = ImageDraw.Draw(img, 'RGBA')
-        
-        # Add some circles/ellipses
-        num_elements = random.randint(3, 6)
-        for _ in range(num_elements):
-            x = random.randint(0, self.WIDTH)
-            y = random.randint(0, self.HEIGHT)
-            size = random.randint(100, 400)
-            color = (*random.choice(self.color_palettes[0]), random.randint(30, 100))
-            draw.ellipse([x-size, y-size, x+size, y+size], fill=color)
-        
-        # Add some lines
-        for _ in range(random.randint(2, 4)):
-            x1 = random.randint(0, self.WIDTH)
-            y1 = random.randint(0, self.HEIGHT)
-            x2 = random.randint(0, self.WIDTH)
-            y2 = random.randint(0, self.HEIGHT)
-            color = (*random.choice(self.color_palettes[0]), random.randint(50, 150))
-            draw.line([(x1, y1), (x2, y2)], fill=color, width=random.randint(3, 8))
+    def add_decorative_elements(self, img: Image.Image,
+                                rng: Optional[random.Random] = None,
+                                palette: Optional[Sequence[Tuple[int, int, int]]] = None,
+                                shapes: Optional[Sequence[str]] = None) -> Image.Image:
+        """Add decorative elements to make the image more attractive.
+        
+        All shapes are drawn into one overlay that is composited onto img
+        with a single paste.
+        
+        Args:
+            img: Image to draw on
+            rng: Per-render random generator (a fresh unseeded one if None);
+                only a decoration seed is drawn from it
+            palette: Colors to pick from, normally the background's palette
+                (the first standard palette if None)
+            shapes: Kinds from DECORATION_SHAPES (DEFAULT_SHAPES if None)
+        """
+        rng = rng or random.Random()
+        overlay, offset = self._decoration_overlay(
+            rng.getrandbits(32), palette or self.COLOR_PALETTES[0], shapes, img.size, cache=False)
+        if overlay is not None:
+            img.paste(overlay, offset, overlay)
         
         return img
     
+    def _decoration_overlay(self, seed: int, palette: Sequence[Tuple[int, int, int]],
+                            shapes: Optional[Sequence[str]], size: Tuple[int, int],
+                            scale: float = 1.0, cache: bool = True):
+        """(overlay, offset) of a decoration set (see render_decorations).
+        
+        With cache, the overlay is looked up in and added to the decoration
+        cache; only seeds that are reused (fixed decoration seeds) should be.
+        """
+        palette = tuple(sanitize_colors(palette))
+        shapes = DEFAULT_SHAPES if shapes is None else tuple(shapes)
+        if not cache:
+            return render_decorations(seed, palette, size[0], size[1], shapes, scale)
+        
+        key = (seed, palette, shapes, size, scale)
+        cached = self.decoration_cache.get(key)
+        if cached is None:
+            overlay, offset = render_decorations(seed, palette, size[0], size[1], shapes, scale)
+            cached = (overlay, offset)
+            self.decoration_cache.put(
+                key, cached, overlay.width * overlay.height * 4 if overlay else 0)
+        return cached
+    
+    def base_layer(self, palette: Sequence[Tuple[int, int, int]],
+                   direction: Union[str, GradientSpec], decoration_seed: int,
+                   shapes: Optional[Sequence[str]] = None,
+                   size: Optional[Tuple[int, int]] = None,
+                   scale: float = 1.0, memoize: bool = True) -> Image.Image:
+        """Gradient background with decorations, memoized by its inputs.
+        
+        Every render with the same palette, direction, decoration seed,
+        shapes and size shares one base layer, so a batch only draws its
+        text layers. Renders whose decoration seed is drawn per image never
+        share a layer; they pass memoize=False and keep it out of the cache.
+        
+        Args:
+            palette: Background colors (decorations pick from them too)
+            direction: Gradient direction name or GradientSpec
+            decoration_seed: Seed of the decoration set
+            shapes: Decoration kinds (DEFAULT_SHAPES if None)
+            size: (width, height) of the canvas (standard size if None)
+            scale: Raster scale; the layer is size * scale pixels
+            memoize: Look the layer up in (and add it to) the layer cache
+            
+        Returns:
+            Shared RGB image; copy it before drawing on it. With
+            memoize=False a new image owned by the caller.
+        """
+        palette = tuple(sanitize_colors(palette))
+        shapes = DEFAULT_SHAPES if shapes is None else tuple(shapes)
+        size = tuple(size or (self.WIDTH, self.HEIGHT))
+        # Without shapes the seed draws nothing, so it mustn't split the key
+        key = (palette, direction, decoration_seed if shapes else None, shapes, size, scale)
+        base = self.layer_cache.get(key) if memoize else None
+        if base is None:
+            # Gradients are defined in relative coordinates, so they are
+            # simply rendered at the pixel size
+            base = self.create_gradient_background(list(palette), direction,
+                                                   scaled_size(size, scale))
+            # Decorations are drawn on the canvas measured in standard
+            # pixels, so shapes keep their proportions on every size
+            unit = canvas_unit(size)
+            logical = (int(round(size[0] / unit)), int(round(size[1] / unit)))
+            overlay, offset = self._decoration_overlay(decoration_seed, palette, shapes,
+                                                       logical, scale * unit, cache=memoize)
+            if overlay is not None:
+                base.paste(overlay, offset, overlay)
+            if memoize:
+                self.layer_cache.put(key, base)
+        return base
+    
+    def _canvas(self, spec: RenderSpec, palette: Sequence[Tuple[int, int, int]],
+                direction: Union[str, GradientSpec], decoration_seed: int,
+                size: Tuple[int, int]) -> Image.Image:
+        """Base layer of a render, ready to draw the text on.
+        
+        Only layers other renders can reuse are memoized: those with a
+        fixed decoration seed or without decorations. The others are drawn
+        for this render alone, which also saves copying them.
+        """
+        shared = spec.decoration_seed is not None or spec.decorations == ()
+        base = self.base_layer(palette, direction, decoration_seed, spec.decorations,
+                               size, spec.scale, memoize=shared)
+        return base.copy() if shared else base
+    
     def _ensure_noto_font(self):
         """Download Noto Sans Ethiopic font if not available."""
         noto_path = os.path.join(self.font_cache_dir, "NotoSansEthiopic-Regular.ttf")
@@ -240,296 +339,414 @@ class TikTokImageGenerator:
     def get_font(self, size: int, text: str = ""):
         """Get a font that supports Unicode/Amharic characters.
         
+        Fonts are discovered once by the registry; this picks the first face
+        (Noto Sans Ethiopic first) whose cmap covers the text and returns a
+        cached FreeTypeFont for the size.
+        
         Args:
             size: Font size
             text: Sample text to check font support (optional)
         """
-        # Check if text contains Amharic characters
-        has_amharic = text and any('\u1200' <= char <= '\u137F' for char in text)
-        
-        # For Amharic text, ALWAYS use Noto Sans Ethiopic if available
-        if has_amharic:
-            noto_path = os.path.join(self.font_cache_dir, "NotoSansEthiopic-Regular.ttf")
-            if os.path.exists(noto_path):
-                try:
-                    font = ImageFont.truetype(noto_path, size)
-                    print(f"✓ Using Noto Sans Ethiopic (best for Amharic)")
-                    return font
-                except Exception as e:
-                    print(f"⚠ Warning: Could not load Noto font: {e}")
-                    # Continue to try other fonts
-        
-        # Fonts that support Amharic/Unicode (prioritized order)
-        font_paths = [
-            # Try to download Noto if not already cached
-            noto_path if os.path.exists(noto_path) else None,
-            # macOS system fonts with Unicode support
-            "/System/Library/Fonts/Supplemental/Arial Unicode.ttf",
-            "/System/Library/Fonts/Supplemental/NotoSansEthiopic-Regular.ttf",
-            "/System/Library/Fonts/Supplemental/NotoSansEthiopic-Bold.ttf",
-            "/Library/Fonts/Arial Unicode.ttf",
-            "/System/Library/Fonts/Supplemental/AppleGothic.ttf",
-            "/System/Library/Fonts/Supplemental/STHeiti Light.ttc",
-            "/System/Library/Fonts/Supplemental/STHeiti Medium.ttc",
-            # Try Arial variants
-            "/System/Library/Fonts/Supplemental/Arial.ttf",
-            "/System/Library/Fonts/Supplemental/Arial Bold.ttf",
-            # Linux/Windows fallbacks
-            "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
-            "/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf",
-            "C:/Windows/Fonts/arial.ttf",
-            "C:/Windows/Fonts/ARIALUNI.TTF",
-        ]
-        
-        # Try each font path
-        for path in font_paths:
-            if path and os.path.exists(path):
-                try:
-                    font = ImageFont.truetype(path, size)
-                    # Test if font can render Amharic characters (if text provided)
-                    if text:
-                        # Check if text contains Amharic characters
-                        has_amharic = any('\u1200' <= char <= '\u137F' for char in text)
-                        if has_amharic:
-                            # Simple test: just check if font can get bbox for Amharic character
-                            test_char = "አ"  # Common Amharic character (U+12A0)
-                            try:
-                                bbox = font.getbbox(test_char)
-                                # If width is reasonable, font supports it
-                                if bbox[2] - bbox[0] > 5:
-                                    print(f"✓ Using font: {path} (supports Amharic)")
-                                    return font
-                            except:
-                                continue  # Font can't handle Amharic, try next
-                    return font
-                except Exception as e:
-                    continue
-        
-        # Last resort: try to find any TTF font in common locations
-        common_dirs = [
-            "/System/Library/Fonts/Supplemental/",
-            "/Library/Fonts/",
-            "/usr/share/fonts/",
-        ]
+        return self.fonts.get_font(size, text)
+    
+    def _build_measurer(self, fonts: Tuple[str, ...]) -> TextMeasurer:
+        registry = self.fonts.prefer(fonts)
+        return self.measurer if registry is self.fonts else TextMeasurer(registry)
+    
+    def text_runs(self, line: str, font) -> List[Tuple[str, ImageFont.FreeTypeFont]]:
+        """Split a line into same-font runs at the size of font.
         
-        for font_dir in common_dirs:
-            if os.path.exists(font_dir):
-                try:
-                    for file in os.listdir(font_dir):
-                        if file.lower().endswith(('.ttf', '.ttc', '.otf')):
-                            font_path = os.path.join(font_dir, file)
-                            try:
-                                font = ImageFont.truetype(font_path, size)
-                                if text:
-                                    # Check if text contains Amharic characters
-                                    has_amharic = any('\u1200' <= char <= '\u137F' for char in text)
-                                    if has_amharic:
-                                        try:
-                                            test_char = "አ"
-                                            bbox = font.getbbox(test_char)
-                                            if bbox[2] - bbox[0] < 5:
-                                                continue  # Font doesn't support Amharic
-                                        except:
-                                            continue  # Font can't handle Amharic
-                                return font
-                            except:
-                                continue
-                except:
-                    continue
-        
-        # Try downloaded Noto Sans Ethiopic (should be available from __init__)
-        noto_path = os.path.join(self.font_cache_dir, "NotoSansEthiopic-Regular.ttf")
-        if os.path.exists(noto_path):
-            try:
-                font = ImageFont.truetype(noto_path, size)
-                if text:
-                    has_amharic = any('\u1200' <= char <= '\u137F' for char in text)
-                    if has_amharic:
-                        try:
-                            test_char = "አ"
-                            bbox = font.getbbox(test_char)
-                            if bbox[2] - bbox[0] >= 5:
-                                return font
-                        except:
-                            pass
-                return font
-            except:
-                pass
-        
-        # Ultimate fallback
-        print("Warning: Could not find Unicode font, using default (may not support Amharic)")
-        return ImageFont.load_default()
+        Each character is drawn with the highest-priority font whose cmap
+        covers it, so mixed Amharic/Latin/digit text renders without tofu.
+        """
+        return self.measurer.runs(line, font)
     
     def wrap_text(self, text: str, font: ImageFont.FreeTypeFont, 
                   max_width: int) -> List[str]:
         """Wrap text to fit within max_width."""
-        words = text.split()
-        lines = []
-        current_line = []
-        
-        for word in words:
-            test_line = ' '.join(current_line + [word])
-            bbox = font.getbbox(test_line)
-            text_width = bbox[2] - bbox[0]
+        return [line for line, _ in self.measurer.wrap(text, font, max_width)]
+    
+    def fit_text(self, text: str, text_box: TextBox, fonts: Sequence[str] = (),
+                 size: Optional[Tuple[int, int]] = None) -> Tuple[int, List[Tuple[str, float]]]:
+        """Pick the largest font size whose wrapped text fits text_box.
+        
+        Args:
+            text: Text content to display
+            text_box: Layout box and size bounds
+            fonts: Fonts tried before the registry's order
+            size: (width, height) of the canvas (standard size if None)
+            
+        Returns:
+            (font_size, lines) where lines are (line, width) pairs
+        """
+        width, height = size or (self.WIDTH, self.HEIGHT)
+        # The box is given for the standard canvas and scales with this one
+        unit = canvas_unit((width, height))
+        measurer = self._measurers(tuple(fonts))
+        return fit_text(
+            measurer, text, lambda font_size: measurer.fonts.get_font(font_size, text),
+            width - 2 * text_box.margin_x * unit, height - 2 * text_box.margin_y * unit,
+            max(1, int(round(text_box.min_size * unit))), max(1, int(round(text_box.max_size * unit))),
+        )
+    
+    def layout_text(self, text: str, text_box: Optional[TextBox] = None,
+                    fonts: Sequence[str] = (),
+                    size: Optional[Tuple[int, int]] = None) -> TextLayout:
+        """Measure and position text once; cached by all arguments.
+        
+        Args:
+            text: Text content to display
+            text_box: Auto-fit the font size to this box; if None the size
+                is chosen from the text length
+            fonts: Fonts tried before the registry's order
+            size: (width, height) of the canvas (standard size if None)
             
-            if text_width <= max_width:
-                current_line.append(word)
+        Returns:
+            TextLayout that can be rasterized at any scale
+        """
+        return self._layouts(text, text_box, tuple(fonts), tuple(size or (self.WIDTH, self.HEIGHT)))
+    
+    def _build_layout(self, text: str, text_box: Optional[TextBox],
+                      fonts: Tuple[str, ...], size: Tuple[int, int]) -> TextLayout:
+        measurer = self._measurers(fonts)
+        if text_box is not None:
+            # Largest size whose wrapped layout fits the box
+            font_size, all_lines = self.fit_text(text, text_box, fonts, size)
+            font = measurer.fonts.get_font(font_size, text)
+        else:
+            # Calculate font size based on text length (120px on the
+            # standard canvas, proportional on other canvases)
+            unit = canvas_unit(size)
+            base_size = 120 * unit
+            text_length = len(text)
+            if text_length > 100:
+                font_size = int(base_size * 0.6)
+            elif text_length > 50:
+                font_size = int(base_size * 0.7)
+            elif text_length > 30:
+                font_size = int(base_size * 0.85)
             else:
-                if current_line:
-                    lines.append(' '.join(current_line))
-                current_line = [word]
+                font_size = int(base_size)
+            
+            # Get font that supports the text (especially for Amharic/Unicode)
+            font = measurer.fonts.get_font(font_size, text)
+            
+            # Split by explicit newlines, then wrap each paragraph into
+            # (line, width) pairs
+            max_width = size[0] - 200 * unit  # Margins
+            all_lines = wrap_paragraphs(measurer, text, font, max_width)
         
-        if current_line:
-            lines.append(' '.join(current_line))
+        return build_layout(measurer, text, font, font_size, all_lines, size)
+    
+    def draw_layout(self, img: Image.Image, layout: TextLayout,
+                    text_color: Tuple[int, int, int],
+                    effects: Optional[Sequence[TextEffect]] = None,
+                    scale: float = 1.0) -> Image.Image:
+        """Rasterize a text layout onto img.
+        
+        Args:
+            img: Image to draw on (its size should be layout.canvas * scale)
+            layout: Layout from layout_text
+            text_color: RGB fill of the text
+            effects: Outline/shadow/glow layers (DEFAULT_EFFECTS if None)
+            scale: Raster scale relative to the layout's canvas
+        """
+        # Text outline/shadow/glow for better readability, derived from a
+        # single rasterization of each line. Extra room covers glyph ink
+        # outside the advance box (overhangs, accents).
+        # Effect radii and offsets are given for the standard canvas
+        unit = canvas_unit(layout.canvas)
+        effects = tuple(
+            replace(e.scaled(scale * unit), color=e.resolve_color(text_color))
+            for e in (DEFAULT_EFFECTS if effects is None else effects)
+        )
+        pad = max_padding(effects) + int(layout.font_size * scale) // 4
+        
+        for line in layout.lines:
+            try:
+                # Repeated lines (hooks, list numbers, CTAs) are one paste
+                key = (tuple((run.text, run.font_path, run.x) for run in line.runs),
+                       layout.font_size, scale, effects, text_color)
+                sprite = self.line_cache.get(key)
+                if sprite is None:
+                    mask = rasterize_line(layout, line, self.fonts, scale, pad)
+                    sprite = render_line_sprite(mask, text_color, effects)
+                    self.line_cache.put(key, sprite)
+                xy = (int(round(line.x * scale)) - pad, int(round(line.y * scale)) - pad)
+                img.paste(sprite, xy, sprite)
+            except Exception as e:
+                print(f"Warning: Could not render line with selected font: {line.text[:30]}...")
+                print(f"Error: {e}")
         
-        return lines if lines else [text]
+        return img
     
-    def add_text_to_image(self, img: Image.Image, text: str) -> Image.Image:
+    def add_text_to_image(self, img: Image.Image, text: str,
+                          rng: Optional[random.Random] = None,
+                          effects: Optional[Sequence[TextEffect]] = None,
+                          text_box: Optional[TextBox] = None,
+                          fonts: Sequence[str] = (),
+                          size: Optional[Tuple[int, int]] = None,
+                          scale: float = 1.0) -> Image.Image:
         """Add text to image with dynamic styling.
         
         Supports multi-line text and Unicode characters (e.g., Amharic).
+        
+        Args:
+            img: Image to draw on
+            text: Text content to display
+            rng: Per-render random generator (a fresh unseeded one if None)
+            effects: Outline/shadow/glow layers (DEFAULT_EFFECTS if None)
+            text_box: Auto-fit the font size to this box; if None the size
+                is chosen from the text length
+            fonts: Fonts tried before the registry's order
+            size: Canvas the text is laid out on (img.size if None)
+            scale: Raster scale of img relative to size
         """
-        draw = ImageDraw.Draw(img)
+        rng = rng or random.Random()
         
         # Choose random text color
-        text_color = random.choice(self.text_colors)
-        
-        # Calculate font size based on text length
-        base_size = 120
-        text_length = len(text)
-        if text_length > 100:
-            font_size = int(base_size * 0.6)
-        elif text_length > 50:
-            font_size = int(base_size * 0.7)
-        elif text_length > 30:
-            font_size = int(base_size * 0.85)
-        else:
-            font_size = base_size
-        
-        # Get font that supports the text (especially for Amharic/Unicode)
-        font = self.get_font(font_size, text)
-        
-        # Handle multi-line text: split by newlines first, then wrap each paragraph
-        max_width = self.WIDTH - 200  # Margins
-        all_lines = []
-        
-        # Split by explicit newlines (preserve user's line breaks)
-        paragraphs = text.split('\n')
-        for paragraph in paragraphs:
-            if paragraph.strip():
-                # Wrap each paragraph
-                wrapped = self.wrap_text(paragraph.strip(), font, max_width)
-                all_lines.extend(wrapped)
-                # Add small gap between paragraphs
-                if len(wrapped) > 0:
-                    all_lines.append("")  # Empty line for spacing
-        
-        # Remove trailing empty line
-        if all_lines and not all_lines[-1]:
-            all_lines.pop()
-        
-        # Calculate total text height
-        line_height = int(font_size * 1.4)
-        total_height = len(all_lines) * line_height
-        
-        # Center vertically
-        start_y = (self.HEIGHT - total_height) // 2
-        
-        # Add text shadow/outline for better readability
-        shadow_offset = 3
-        
-        # Draw each line
-        for i, line in enumerate(all_lines):
-            if not line:  # Skip empty lines (spacing)
-                continue
-                
-            y = start_y + i * line_height
-            
-            # Get text dimensions (handles Unicode properly)
-            try:
-                bbox = font.getbbox(line)
-                text_width = bbox[2] - bbox[0]
-            except:
-                # Fallback for complex Unicode
-                text_width = len(line) * font_size * 0.6
-            
-            # Center horizontally
-            x = (self.WIDTH - text_width) // 2
+        text_color = rng.choice(self.TEXT_COLORS)
+        
+        layout = self.layout_text(text, text_box, fonts, size or img.size)
+        return self.draw_layout(img, layout, text_color, effects, scale)
+    
+    def render(self, text: str, spec: RenderSpec) -> Image.Image:
+        """Render one image: memoized base layer plus its text layer.
+        
+        Random choices come from a generator seeded with spec.seed, in a
+        fixed order (palette and direction when left None, decoration set,
+        text color), so the same text and spec give the same image.
+        
+        Args:
+            text: Text content to display
+            spec: Everything else the image depends on
             
-            # Draw shadow
-            shadow_color = (0, 0, 0) if text_color == (255, 255, 255) else (255, 255, 255)
-            for dx in range(-shadow_offset, shadow_offset + 1):
-                for dy in range(-shadow_offset, shadow_offset + 1):
-                    if dx != 0 or dy != 0:
-                        try:
-                            draw.text((x + dx, y + dy), line, font=font, fill=shadow_color)
-                        except:
-                            pass  # Skip shadow if there's an issue
+        Returns:
+            The rendered image
+        """
+        if spec.targets:
+            return self.render_targets(text, spec)[0]
+        rng, palette, direction, decoration_seed = self._draw_choices(spec)
+        
+        # Background and decorations come from the layer cache when the
+        # batch shares them; only the text is drawn per image. A preview
+        # (scale < 1) shares the full render's text layout and random draws
+        # and only rasterizes smaller.
+        img = self._canvas(spec, palette, direction, decoration_seed, spec.size)
+        return self.add_text_to_image(img, text, rng, spec.effects, spec.text_box, spec.fonts,
+                                      spec.size, spec.scale)
+    
+    def _draw_choices(self, spec: RenderSpec):
+        """(rng, palette, direction, decoration_seed) of a render, in fixed order."""
+        rng = random.Random(new_seed() if spec.seed is None else spec.seed)
+        palette = spec.palette or rng.choice(self.COLOR_PALETTES)
+        direction = spec.direction or rng.choice(LEGACY_DIRECTIONS)
+        
+        # Always draw from rng so the text color doesn't depend on
+        # whether a decoration seed was given
+        decoration_seed = rng.getrandbits(32)
+        if spec.decoration_seed is not None:
+            decoration_seed = spec.decoration_seed
+        return rng, palette, direction, decoration_seed
+    
+    def render_targets(self, text: str, spec: RenderSpec) -> List[Image.Image]:
+        """Render one composition at spec.size and every spec.targets size.
+        
+        The text is measured and wrapped once, on the largest canvas (in
+        standard pixels) that fits inside every target, and that layout is
+        centered on each target. All targets share the palette, direction,
+        decorations and text color; backgrounds and decorations are drawn
+        natively at each size.
+        
+        Args:
+            text: Text content to display
+            spec: Render inputs; spec.targets lists the extra sizes
             
-            # Draw main text
-            try:
-                draw.text((x, y), line, font=font, fill=text_color)
-            except Exception as e:
-                # Don't fallback to default font for Amharic - it won't work
-                # Just report the error
-                print(f"Warning: Could not render line with selected font: {line[:30]}...")
-                print(f"Error: {e}")
-                # Try to render anyway - sometimes it works despite the exception
-                try:
-                    draw.text((x, y), line, font=font, fill=text_color)
-                except:
-                    pass
+        Returns:
+            One image per size: spec.size first, then spec.targets in order
+        """
+        sizes = [tuple(spec.size)] + [tuple(size) for size in spec.targets]
+        rng, palette, direction, decoration_seed = self._draw_choices(spec)
+        text_color = rng.choice(self.TEXT_COLORS)
+        
+        # Targets in standard pixels; the shared layout fits all of them
+        logical = [(size[0] / canvas_unit(size), size[1] / canvas_unit(size)) for size in sizes]
+        layout = self.layout_text(text, spec.text_box, spec.fonts, self.layout_canvas(spec))
+        
+        images = []
+        for size, (width, height) in zip(sizes, logical):
+            img = self._canvas(spec, palette, direction, decoration_seed, size)
+            target_layout = layout.recentered((int(round(width)), int(round(height))))
+            images.append(self.draw_layout(img, target_layout, text_color, spec.effects,
+                                           spec.scale * canvas_unit(size)))
+        return images
+    
+    def layout_canvas(self, spec: RenderSpec) -> Tuple[int, int]:
+        """Canvas the text of a render is measured and wrapped on.
         
-        return img
+        spec.size, or with render targets the largest canvas in standard
+        pixels that fits inside every target (see render_targets).
+        """
+        if not spec.targets:
+            return tuple(spec.size)
+        sizes = [tuple(spec.size)] + [tuple(size) for size in spec.targets]
+        logical = [(size[0] / canvas_unit(size), size[1] / canvas_unit(size)) for size in sizes]
+        return int(min(w for w, _ in logical)), int(min(h for _, h in logical))
     
-    def generate_image(self, text: str, index: int = 0) -> str:
-        """Generate a single image with text.
+    def render_to_bytes(self, text: str, spec: Optional[RenderSpec] = None) -> bytes:
+        """Render text and encode it in memory, without writing a file.
         
         Args:
             text: Text content to display
-            index: Index for filename
+            spec: Render inputs; spec.encoding selects the format
             
         Returns:
-            Path to generated image
+            The encoded image
         """
-        # Choose random color palette and direction
-        palette = random.choice(self.color_palettes)
-        direction = random.choice(["vertical", "horizontal", "diagonal"])
+        spec = spec or RenderSpec()
+        return spec.encoding.encode(self.render(text, spec))
+    
+    def render_to_buffer(self, text: str, fp: BinaryIO, spec: Optional[RenderSpec] = None) -> None:
+        """Render text and encode it into a writable binary stream."""
+        spec = spec or RenderSpec()
+        spec.encoding.save(self.render(text, spec), fp)
+    
+    def save_image(self, img: Image.Image, name: str, spec: RenderSpec) -> str:
+        """Save img in the output directory, encoded as spec.encoding.
         
-        # Create gradient background
-        img = self.create_gradient_background(palette, direction)
+        Args:
+            img: Rendered image
+            name: File name without extension
+            spec: Spec the image was rendered with
+            
+        Returns:
+            Path to the saved file
+        """
+        filepath = self.output_path(name, spec)
+        # Written under a temporary name and renamed, so a concurrent reader
+        # (or a job reusing the file) never sees a partial image
+        tmp_path = f"{filepath}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            spec.encoding.save(img, tmp_path)
+            os.replace(tmp_path, filepath)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return filepath
+    
+    def output_path(self, name: str, spec: RenderSpec) -> str:
+        """Path of the output file name (without extension) in spec's format."""
+        return os.path.join(self.output_dir, name + spec.extension)
+    
+    @property
+    def render_salt(self) -> str:
+        """Renderer state outside the spec that changes output: the font order."""
+        return "|".join(face.path for face in self.fonts.faces)
+    
+    def content_job(self, text: str, spec: RenderSpec) -> RenderJob:
+        """Job saving text under a name derived from its render inputs.
         
-        # Add decorative elements
-        img = self.add_decorative_elements(img)
+        Equal text and seeded spec give the same file, so a repeated render
+        is skipped and reuses the stored image.
         
-        # Add text
-        img = self.add_text_to_image(img, text)
+        Args:
+            text: Text content to display
+            spec: Render inputs; must be seeded
+            
+        Returns:
+            RenderJob with a content-addressed name
+        """
+        return RenderJob(text, spec, content_name(text, spec, self.render_salt), reuse=True)
+    
+    def generate_image(self, text: str, index: int = 0,
+                       spec: Optional[RenderSpec] = None) -> str:
+        """Generate a single image with text.
         
-        # Save image
-        filename = f"tiktok_image_{index:03d}.png"
-        filepath = os.path.join(self.output_dir, filename)
-        img.save(filepath, "PNG", quality=95)
+        The image is stored under a content-addressed name, so it never
+        overwrites another image and an identical render is not redone.
         
-        return filepath
+        Args:
+            text: Text content to display
+            index: Position of the image in its batch (for messages)
+            spec: Render inputs; the default spec picks a random standard
+                palette and direction with a new seed
+            
+        Returns:
+            Path to generated image
+        """
+        spec = spec or RenderSpec()
+        if spec.seed is None:
+            # Fix the seed first: the name is a hash of the render inputs
+            spec = replace(spec, seed=new_seed())
+        result = run_job(self, index, self.content_job(text, spec))
+        if not result.ok:
+            raise RuntimeError(result.error)
+        return result.path
+    
+    def render_batch(self, jobs: Sequence[RenderJob], workers: int = 1) -> List[BatchResult]:
+        """Render independent jobs, optionally on a process pool.
+        
+        Args:
+            jobs: Images to render
+            workers: Worker processes; 1 renders in this process. For
+                repeated batches keep a BatchRenderer alive instead, so
+                workers start only once.
+            
+        Returns:
+            One BatchResult per job, in input order; a failing job doesn't
+            abort the others
+        """
+        if workers > 1 and len(jobs) > 1:
+            # Workers map the atlas file instead of building their own
+            self.backgrounds.load()
+            with BatchRenderer(self.output_dir, min(workers, len(jobs))) as pool:
+                return pool.render(jobs)
+        return [run_job(self, i, job) for i, job in enumerate(jobs)]
     
-    def generate_batch(self, texts: List[str]) -> List[str]:
+    def generate_batch(self, texts: List[str], spec: Optional[RenderSpec] = None,
+                       workers: int = 1) -> List[Optional[str]]:
         """Generate multiple images from a list of texts.
         
         Args:
             texts: List of text strings
+            spec: Render inputs shared by the batch; image i is rendered
+                with seed derive_seed(spec.seed, i) (a base seed is drawn
+                if spec.seed is None)
+            workers: Worker processes to render with (1 = this process)
             
         Returns:
-            List of file paths to generated images
+            List of file paths to generated images, in input order; None
+            for texts that failed to render
         """
-        filepaths = []
-        for i, text in enumerate(texts):
-            print(f"Generating image {i+1}/{len(texts)}: {text[:50]}...")
-            filepath = self.generate_image(text, i)
-            filepaths.append(filepath)
-        
-        print(f"\n✅ Generated {len(filepaths)} images in '{self.output_dir}' directory")
+        spec = spec or RenderSpec()
+        if spec.seed is None:
+            spec = replace(spec, seed=new_seed())
+        # Content-addressed names: batches no longer overwrite each other,
+        # and texts rendered before with the same seed are not redone
+        jobs = [
+            self.content_job(text, replace(spec, seed=derive_seed(spec.seed, i)))
+            for i, text in enumerate(texts)
+        ]
+        print(f"Generating {len(jobs)} image(s) with {max(1, min(workers, len(jobs)))} worker(s)...")
+        results = self.render_batch(jobs, workers)
+        filepaths = [result.path for result in results]
+        
+        failed = sum(1 for result in results if not result.ok)
+        print(f"\n✅ Generated {len(filepaths) - failed} images in '{self.output_dir}' directory")
+        if failed:
+            print(f"⚠️  {failed} image(s) failed")
         return filepaths
 
+def new_seed() -> int:
+    """Draw a fresh render seed from the OS entropy pool."""
+    return random.SystemRandom().randrange(2 ** 31)
+
+
+def derive_seed(seed: int, index: int) -> int:
+    """Seed for the index-th image of a batch rendered with a base seed."""
+    return seed + index
+
 
 def parse_texts(input_text: str) -> List[str]:
     """Parse input text that may contain numbered items or multi-line format.
@@ -594,14 +811,27 @@ def parse_texts(input_text: str) -> List[str]:
 
 def main():
     """Main function to run the generator."""
-    import sys
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Generate TikTok images from text.")
+    parser.add_argument("texts", nargs="*", help="Texts to render (interactive mode if omitted)")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="Base seed for reproducible renders (random if omitted)")
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="Worker processes to render with (default: 1)")
+    parser.add_argument("--format", default="png", choices=sorted(ENCODING_PRESETS),
+                        help="Output encoding preset (default: png)")
+    parser.add_argument("--benchmark-formats", action="store_true",
+                        help="Render the first text and report encode time and size "
+                             "of every output encoding instead of saving images")
+    args = parser.parse_args()
     
     texts = []
     
     # Check if texts provided as command line arguments
-    if len(sys.argv) > 1:
+    if args.texts:
         # Join all arguments as a single text block and parse
-        input_text = ' '.join(sys.argv[1:])
+        input_text = ' '.join(args.texts)
         texts = parse_texts(input_text)
         print(f"📝 Received {len(texts)} text(s) from command line arguments")
     else:
@@ -658,7 +888,14 @@ def main():
     generator = TikTokImageGenerator(output_dir="output")
     
     # Generate images
-    generator.generate_batch(texts)
+    seed = new_seed() if args.seed is None else args.seed
+    print(f"🎲 Seed: {seed}")
+    spec = RenderSpec(seed=seed, encoding=ENCODING_PRESETS[args.format])
+    if args.benchmark_formats:
+        img = generator.render(texts[0], spec)
+        print(format_benchmark(benchmark(img)))
+        return
+    generator.generate_batch(texts, spec, workers=max(1, args.jobs))
 
 
 if __name__ == "__main__":